@@ -0,0 +1,90 @@
+"""
+air_parser.py
+-------------
+Lector rápido de los .txt horarios de la Red de Vigilancia de la
+Generalitat Valenciana (air_txt/*.txt).
+
+Formato del fichero:
+    Red: ...
+    Estación: 46250047-València - Av. França
+    <línea en blanco>
+    FECHA   HORA    Veloc.  Direc.  ...          ← cabecera (tabuladores)
+            m/s     grados  ...                  ← unidades
+    01/01/2022  00  0,2     27      ...          ← datos
+
+La cabecera se lee una sola vez; el bloque de datos se tokeniza con el
+motor C de pandas usando el tabulador como separador fijo (tras convertir
+las '/' de la fecha en tabuladores a nivel de bytes), y `datetime` se
+construye directamente a partir de las columnas numéricas día/mes/año/hora.
+
+Los huecos (dos tabuladores seguidos) se leen como NaN en su columna; el
+antiguo separador r"\\s+" los colapsaba y desplazaba los valores.
+"""
+from __future__ import annotations
+import re
+from io import BytesIO
+from pathlib import Path
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+
+ENCODING="latin1"; DECIMAL=","; NA=["","-","NA"]
+_DATE_PARTS = ["day", "month", "year", "hour"]
+_DT_UNIT = pd.to_datetime(["2022-01-01 00"], format="%Y-%m-%d %H").dtype  # unidad por defecto de pandas
+
+
+class TxtHeader(NamedTuple):
+    station_id: str
+    station_name: str
+    columns: list[str]          # variables medidas (sin FECHA/HORA)
+    units: dict[str, str]       # variable → unidad (2ª línea de cabecera)
+    data_offset: int            # byte donde empiezan los datos
+
+
+def parse_header(raw: bytes) -> TxtHeader:
+    """Localiza estación, columnas, unidades y el inicio del bloque de datos."""
+    pos, st_id = 0, None
+    while True:
+        end = raw.find(b"\n", pos)
+        if end < 0:
+            raise ValueError("cabecera FECHA no encontrada")
+        line = raw[pos:end].decode(ENCODING).rstrip("\r")
+        pos = end + 1
+        if line.startswith("Estación:"):
+            st_id, st_name = re.findall(r"Estación:\s*(\d+)-\s*(.+)", line)[0]
+        elif line.lstrip().startswith("FECHA"):
+            break
+    if st_id is None:
+        raise ValueError("línea 'Estación:' no encontrada")
+    cols = line.split()[2:]                                  # fuera FECHA, HORA
+    end = raw.find(b"\n", pos)
+    end = len(raw) if end < 0 else end
+    units = raw[pos:end].decode(ENCODING).rstrip("\r").split("\t")[2:]
+    units = dict(zip(cols, (u.strip() for u in units + [""] * len(cols))))
+    return TxtHeader(st_id, st_name.strip(), cols, units, end + 1)
+
+
+def _assemble_datetime(day, month, year, hour) -> np.ndarray:
+    """Enteros día/mes/año/hora → datetime64 sin pasar por cadenas."""
+    months = ((year - 1970) * 12 + month - 1).astype("M8[M]")
+    hours = ((day - 1) * 24 + hour).astype("m8[h]")
+    return (months.astype("M8[h]") + hours).astype(_DT_UNIT)
+
+
+def load_txt(f: Path) -> pd.DataFrame:
+    """Un fichero .txt → DataFrame horario de una estación.
+
+    Columnas: variables medidas (float), datetime, station_id, station_name.
+    Las unidades quedan en `df.attrs["units"]`.
+    """
+    raw = Path(f).read_bytes()
+    hdr = parse_header(raw)
+    body = raw[hdr.data_offset:].replace(b"/", b"\t")       # dd/mm/yyyy → 3 cols
+    df = pd.read_csv(BytesIO(body), sep="\t", engine="c", header=None,
+                     names=_DATE_PARTS + hdr.columns, decimal=DECIMAL,
+                     na_values=NA, encoding=ENCODING)
+    df["datetime"] = _assemble_datetime(*(df[c].to_numpy() for c in _DATE_PARTS))
+    df.drop(columns=_DATE_PARTS, inplace=True)
+    df["station_id"], df["station_name"] = hdr.station_id, hdr.station_name
+    df.attrs["units"] = hdr.units
+    return df
@@ -0,0 +1,211 @@
+"""
+analytics.py
+------------
+Estadística compartida por el pipeline (cubo), app.py y el EDA.
+
+Todo en NumPy y en bloque:
+  kpis       mean / std / min / max de varias columnas a la vez
+  pearson    correlación por pares con observaciones completas (como pandas)
+  spearman   Pearson sobre rangos promedio de cada columna
+  ols_groups mínimos cuadrados con intercepto para N grupos en una llamada:
+             X'X y X'y se acumulan por grupo con reduceat y se resuelven
+             todas las ecuaciones normales juntas (pinv apilado)
+  ols        el caso de un solo grupo
+  xcorr      correlación cruzada con retardo (lag 0…L) de muchas series a
+             la vez: las seis sumas de Pearson de cada lag salen de
+             correlaciones circulares por FFT, O(n log n) para todos los lags
+  rolling    media, varianza y correlación en ventanas móviles en O(n):
+             cada ventana es la diferencia de dos sumas acumuladas
+
+Las filas con algún NaN en X o y se descartan del ajuste de su grupo; en
+xcorr y rolling cuentan sólo los pares (o puntos) con dato, como en pandas.
+"""
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+
+KPI_STATS = ["mean", "std", "min", "max"]
+XCORR_BLOCK = 32                                     # series por bloque de FFT (acota la memoria)
+
+
+def kpis(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
+    """Índice = variable; columnas mean/std/min/max (NaN ignorados, std con ddof=1)."""
+    a = df[cols].to_numpy("float64")
+    with np.errstate(invalid="ignore"):
+        out = np.column_stack([np.nanmean(a, 0), np.nanstd(a, 0, ddof=1),
+                               np.nanmin(a, 0), np.nanmax(a, 0)])
+    return pd.DataFrame(out, index=pd.Index(cols, name="variable"), columns=KPI_STATS)
+
+
+def _corr(a: np.ndarray) -> np.ndarray:
+    """Pearson por pares sobre las filas donde ambas columnas tienen dato."""
+    m = ~np.isnan(a)
+    x = np.where(m, a, 0.0)
+    mf = m.astype("float64")
+    n = mf.T @ mf                                    # n_ij observaciones comunes
+    sx = x.T @ mf                                    # Σ x_i  sobre filas con j
+    sxx = (x * x).T @ mf
+    sxy = x.T @ x
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sxy - sx * sx.T / n
+        var_i = sxx - sx ** 2 / n
+        r = cov / np.sqrt(var_i * var_i.T)
+    np.fill_diagonal(r, np.where(np.diag(n) > 1, 1.0, np.nan))
+    return np.clip(r, -1.0, 1.0)
+
+
+def pearson(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
+    r = _corr(df[cols].to_numpy("float64"))
+    return pd.DataFrame(r, index=pd.Index(cols, name="variable"), columns=cols)
+
+
+def spearman(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
+    """Pearson sobre rangos (igual que pandas si no hay NaN; con NaN cada
+    columna se rankea una vez sobre sus valores, no por pares)."""
+    ranks = df[cols].rank(method="average").to_numpy("float64")
+    return pd.DataFrame(_corr(ranks), index=pd.Index(cols, name="variable"), columns=cols)
+
+
+def ols_groups(X: np.ndarray, y: np.ndarray, groups=None,
+               names: list[str] | None = None) -> pd.DataFrame:
+    """Un ajuste y ~ 1 + X por grupo.
+
+    X (n, p), y (n,), groups (n,) etiquetas (None = un solo grupo).
+    Devuelve índice = grupo y columnas intercept, coef_<x>…, r2, n.
+    """
+    X = np.asarray(X, "float64").reshape(len(y), -1)
+    y = np.asarray(y, "float64")
+    p = X.shape[1]
+    names = names or [f"x{i}" for i in range(p)]
+    codes, labels = (np.zeros(len(y), int), pd.Index([0])) if groups is None \
+        else pd.factorize(np.asarray(groups), sort=True)
+    ok = ~(np.isnan(X).any(axis=1) | np.isnan(y)) & (codes >= 0)
+    A = np.column_stack([np.ones(ok.sum()), X[ok]])
+    yv, cv = y[ok], codes[ok]
+    order = np.argsort(cv, kind="stable")
+    A, yv, cv = A[order], yv[order], cv[order]
+
+    G = len(labels)
+    present, starts = np.unique(cv, return_index=True)
+    def per_group(v: np.ndarray) -> np.ndarray:      # Σ por grupo (0 si vacío)
+        out = np.zeros((G,) + v.shape[1:])
+        if len(v):
+            out[present] = np.add.reduceat(v, starts, axis=0)
+        return out
+
+    xtx = per_group(A[:, :, None] * A[:, None, :])   # (G, p+1, p+1)
+    xty = per_group(A * yv[:, None])                 # (G, p+1)
+    n = per_group(np.ones(len(yv)))
+    sy, syy = per_group(yv), per_group(yv * yv)
+
+    beta = (np.linalg.pinv(xtx) @ xty[:, :, None])[:, :, 0]
+    sse = syy - 2 * (beta * xty).sum(1) + np.einsum("gi,gij,gj->g", beta, xtx, beta)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sst = syy - sy ** 2 / n
+        r2 = np.where(sst > 0, 1 - sse / sst, np.nan)
+    enough = n > p                                   # al menos p+1 puntos
+    beta[~enough] = np.nan
+    r2[~enough] = np.nan
+
+    out = pd.DataFrame(beta, columns=["intercept"] + [f"coef_{c}" for c in names],
+                       index=pd.Index(labels, name=None if groups is None
+                                      else getattr(groups, "name", None)))
+    out["r2"] = r2
+    out["n"] = n.astype("int64")
+    return out
+
+
+def _centered(a: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(valores centrados por fila con 0 en los NaN, máscara de dato, media)."""
+    m = ~np.isnan(a)
+    mean = np.where(m, a, 0.0).sum(-1, keepdims=True) / np.maximum(m.sum(-1, keepdims=True), 1)
+    return np.where(m, a - mean, 0.0), m.astype("float64"), mean
+
+
+def _fft_len(n: int) -> int:
+    """Menor 2^a·3^b·5^c >= n: tamaño rápido para la FFT (la mitad que la
+    potencia de 2 siguiente en el peor caso)."""
+    best = 1 << int(np.ceil(np.log2(n)))
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            p = p35
+            while p < n:
+                p *= 2
+            best, p35 = min(best, p), p35 * 3
+        p5 *= 5
+    return best
+
+
+def xcorr(x: np.ndarray, y: np.ndarray, max_lag: int,
+          min_periods: int = 3) -> tuple[np.ndarray, np.ndarray]:
+    """Pearson entre x[t] e y[t + lag] para lag = 0…max_lag, fila a fila.
+
+    x (n,) o (k, n) e y (k, n) sobre la misma rejilla (NaN = sin dato).
+    Devuelve (r, n) de forma (k, max_lag + 1): igual que
+    `pd.Series(x).corr(pd.Series(y).shift(-lag))` para cada lag.
+    """
+    x = np.atleast_2d(np.asarray(x, "float64"))
+    y = np.atleast_2d(np.asarray(y, "float64"))
+    if len(y) > XCORR_BLOCK:
+        parts = [xcorr(x if len(x) == 1 else x[i:i + XCORR_BLOCK], y[i:i + XCORR_BLOCK],
+                       max_lag, min_periods) for i in range(0, len(y), XCORR_BLOCK)]
+        return tuple(np.concatenate(p) for p in zip(*parts))
+    x, mx, _ = _centered(x)                          # centrar: menos cancelación
+    y, my, _ = _centered(y)
+    nfft = _fft_len(2 * x.shape[-1] - 1)             # sin solape circular
+    F = lambda v: np.fft.rfft(v, nfft, axis=-1)
+    Fmx, Fx, Fxx = F(mx), F(x), F(x * x)
+    Fmy, Fy, Fyy = F(my), F(y), F(y * y)
+    def cc(a, b):                                    # Σ_t a[t]·b[t + lag]
+        return np.fft.irfft(np.conj(a) * b, nfft, axis=-1)[..., :max_lag + 1]
+    n = np.rint(cc(Fmx, Fmy))
+    sx, sy = cc(Fx, Fmy), cc(Fmx, Fy)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = cc(Fx, Fy) - sx * sy / n
+        var = (cc(Fxx, Fmy) - sx ** 2 / n) * (cc(Fmx, Fyy) - sy ** 2 / n)
+        r = np.where((n >= min_periods) & (var > 0), cov / np.sqrt(var), np.nan)
+    return np.clip(r, -1.0, 1.0), n.astype("int64")
+
+
+def _window_sum(v: np.ndarray, window: int) -> np.ndarray:
+    c = np.cumsum(v, axis=-1)
+    c[..., window:] = c[..., window:] - c[..., :-window].copy()
+    return c
+
+
+def rolling(a: np.ndarray, window: int, b: np.ndarray | None = None,
+            min_periods: int | None = None) -> dict[str, np.ndarray]:
+    """Media, varianza (ddof=1) y, con `b`, correlación de las ventanas de
+    `window` puntos que acaban en cada posición (último eje), como
+    `pd.Series.rolling(window, min_periods)`. NaN ignorados; con `b` sólo
+    cuentan los puntos en que ambas series tienen dato."""
+    min_periods = max(window if min_periods is None else min_periods, 1)
+    a = np.asarray(a, "float64")
+    if b is not None:
+        b = np.asarray(b, "float64")
+        both = np.isnan(a) | np.isnan(b)
+        a, b = np.where(both, np.nan, a), np.where(both, np.nan, b)
+    ca, m, mu = _centered(a)
+    n = _window_sum(m, window)
+    sa, saa = _window_sum(ca, window), _window_sum(ca * ca, window)
+    ok = n >= min_periods
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ssa = np.maximum(saa - sa * sa / n, 0)
+        out = {"mean": np.where(ok, sa / n + mu, np.nan),
+               "var": np.where(ok & (n > 1), ssa / (n - 1), np.nan)}
+        if b is not None:
+            cb, _, _ = _centered(b)
+            sb, sbb = _window_sum(cb, window), _window_sum(cb * cb, window)
+            cov = _window_sum(ca * cb, window) - sa * sb / n
+            den = ssa * np.maximum(sbb - sb * sb / n, 0)
+            out["corr"] = np.where(ok & (den > 0), np.clip(cov / np.sqrt(den), -1, 1), np.nan)
+    return out
+
+
+def ols(X: np.ndarray, y: np.ndarray) -> dict:
+    """Mínimos cuadrados con intercepto (filas con NaN descartadas)."""
+    row = ols_groups(X, y).iloc[0]
+    coef = [float(v) for k, v in row.items() if k.startswith("coef_")]
+    return {"intercept": float(row["intercept"]), "coef": coef, "r2": float(row["r2"])}
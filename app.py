@@ -1,23 +1,20 @@
 import streamlit as st
-import pandas as pd
-import os
 import plotly.express as px
-import plotly.graph_objects as go
-from sklearn.linear_model import LinearRegression
-import seaborn as sns
+import dashboard_data as data
+import downsample
 
 
 
 st.set_page_config(
-    page_title="Valenbisi × Calidad del Aire 2022",
-    page_icon="logo.png",  # Icono cuadrado para la pestaña
+    page_title="Valenbisi × Calidad del Aire",
+    page_icon=data.image("logo.png"),  # Icono cuadrado para la pestaña (64 px)
     layout="wide"
 )
 
 # Cabecera con logo y título alineados
 col1, col2, col3 = st.columns([1, 3, 1])
 with col2:
-    st.image("favicon.png", width=600)  # Ajusta el tamaño según prefieras
+    st.image(data.image("favicon.png"), width=600)  # 1200 px: nítido en HiDPI
 # with col2:
 #     st.markdown(
 #         "<h1 style='margin-top: 30px; margin-bottom: 0;'>🚲 Valenbisi × Calidad del Aire 2022</h1>",
@@ -31,26 +28,34 @@ seccion = st.sidebar.radio('Ir a:', [
     'Análisis temporal',
     'Análisis espacial',
     'Correlaciones y modelos',
-    'Comparativas'
+    'Comparativas',
+    'Disponibilidad en directo'
 ])
+anios = data.years()
+anio = st.sidebar.selectbox('Año', anios, index=len(anios) - 1)
 
-# Cargar datos principales
-city = pd.read_csv('data/city_bike_air_2022.csv')
-city['is_weekend'] = city['dow'].apply(lambda x: 1 if x in [5, 6] else 0)
+# Cubo de agregados del año (caché compartida, se invalida si cambian los
+# ficheros); cada sección lee sólo las tablas que usa
+cube = data.cube(anio)
 
 # --- Sección: Resumen KPIs ---
 if seccion == 'Resumen KPIs':
     st.header('KPIs principales')
-    st.info('Resumen de los principales indicadores de uso de Valenbisi y calidad del aire en València durante 2022. Observa la evolución temporal y los valores extremos.')
+    kpis = cube['kpis']
+    st.info(f'Resumen de los principales indicadores de uso de Valenbisi y calidad del aire en València durante {anio}. Observa la evolución temporal y los valores extremos.')
     col1, col2, col3, col4, col5 = st.columns(5)
-    col1.metric('NO₂ medio', f"{city['NO2'].mean():.2f}", f"max: {city['NO2'].max():.1f}")
-    col2.metric('PM10 medio', f"{city['PM10'].mean():.2f}", f"max: {city['PM10'].max():.1f}")
-    col3.metric('PM2.5 medio', f"{city['PM2_5'].mean():.2f}", f"max: {city['PM2_5'].max():.1f}")
-    col4.metric('O₃ medio', f"{city['O3'].mean():.2f}", f"max: {city['O3'].max():.1f}")
-    col5.metric('Viajes bici/día', f"{city['bike_trips'].mean():.0f}", f"max: {city['bike_trips'].max():.0f}")
+    col1.metric('NO₂ medio', f"{kpis.at['NO2','mean']:.2f}", f"max: {kpis.at['NO2','max']:.1f}")
+    col2.metric('PM10 medio', f"{kpis.at['PM10','mean']:.2f}", f"max: {kpis.at['PM10','max']:.1f}")
+    col3.metric('PM2.5 medio', f"{kpis.at['PM2_5','mean']:.2f}", f"max: {kpis.at['PM2_5','max']:.1f}")
+    col4.metric('O₃ medio', f"{kpis.at['O3','mean']:.2f}", f"max: {kpis.at['O3','max']:.1f}")
+    col5.metric('Viajes bici/día', f"{kpis.at['bike_trips','mean']:.0f}", f"max: {kpis.at['bike_trips','max']:.0f}")
     st.subheader('Evolución temporal de NO₂ y viajes en bici')
     st.info('Serie temporal conjunta de la contaminación (NO₂) y el uso de la bici pública por hora, día y mes.')
-    fig = px.line(city, y=['NO2', 'bike_trips'], labels={'value':'Valor','index':'Índice temporal','variable':'Variable'})
+    # Sólo se envían ~POINTS puntos por serie de la ventana elegida (LTTB)
+    city = data.city(anio, columns=['NO2', 'bike_trips'])
+    ventana = st.slider('Ventana (índice temporal)', 0, len(city), (0, len(city)))
+    serie = downsample.series(city, ['NO2', 'bike_trips'], window=ventana)
+    fig = px.line(serie, y=['NO2', 'bike_trips'], labels={'value':'Valor','index':'Índice temporal','variable':'Variable'})
     st.plotly_chart(fig, use_container_width=True)
 
 # --- Sección: Análisis temporal ---
@@ -58,30 +63,25 @@ elif seccion == 'Análisis temporal':
     st.header('Análisis temporal')
     st.info('Explora cómo varían la contaminación y el uso de la bici a lo largo del tiempo: por horas, días y meses.')
     st.subheader('Heatmap NO₂ por hora y día de la semana')
-    heatmap_no2 = city.pivot_table(index='hour', columns='dow', values='NO2', aggfunc='mean')
-    fig1 = px.imshow(heatmap_no2, labels=dict(x='Día de la semana (0=Lunes)', y='Hora', color='NO₂'))
+    fig1 = px.imshow(cube['heat_NO2'], labels=dict(x='Día de la semana (0=Lunes)', y='Hora', color='NO₂'))
     st.plotly_chart(fig1, use_container_width=True)
     st.subheader('Heatmap viajes bici por hora y día de la semana')
-    heatmap_bike = city.pivot_table(index='hour', columns='dow', values='bike_trips', aggfunc='mean')
-    fig2 = px.imshow(heatmap_bike, labels=dict(x='Día de la semana (0=Lunes)', y='Hora', color='Viajes bici'))
+    fig2 = px.imshow(cube['heat_bike_trips'], labels=dict(x='Día de la semana (0=Lunes)', y='Hora', color='Viajes bici'))
     st.plotly_chart(fig2, use_container_width=True)
     st.subheader('Boxplots NO₂ y viajes bici por mes')
     st.info('Distribución de los valores mensuales para identificar patrones y outliers.')
-    fig3 = px.box(city, x='month', y='NO2', points='all', labels={'NO2':'NO₂','month':'Mes'})
+    # Cuartiles precalculados en el cubo + outliers más extremos
+    fig3 = downsample.box_figure(cube['box_month'], cube['box_month_out'], 'month', 'NO2', {'NO2':'NO₂','month':'Mes'})
     st.plotly_chart(fig3, use_container_width=True)
-    fig4 = px.box(city, x='month', y='bike_trips', points='all', labels={'bike_trips':'Viajes bici','month':'Mes'})
+    fig4 = downsample.box_figure(cube['box_month'], cube['box_month_out'], 'month', 'bike_trips', {'bike_trips':'Viajes bici','month':'Mes'})
     st.plotly_chart(fig4, use_container_width=True)
 
 # --- Sección: Análisis espacial ---
 elif seccion == 'Análisis espacial':
     st.header('Análisis espacial')
     st.info('Visualiza la distribución espacial de la contaminación y el uso de la bici en las estaciones de Valenbisi.')
-    # Cargar datos de estaciones con lat/lon
-    crosswalk = pd.read_csv('data/stations_crosswalk.csv')
-    spatial = pd.read_csv('data/bike_air_spatial_hour_2022.csv')
-    # Media por estación
-    spatial_mean = spatial.groupby('codigo_estacion').agg({'NO2':'mean','prestamos_mean':'mean'}).reset_index()
-    estaciones = pd.merge(crosswalk, spatial_mean, on='codigo_estacion', how='left')
+    # Estaciones con lat/lon y medias por estación (precalculadas en el cubo)
+    estaciones = cube['station'].dropna(subset=['NO2', 'prestamos_mean'])  # sin datos horarios: fuera del mapa
     st.subheader('Mapa interactivo de estaciones')
     fig_map = px.scatter_mapbox(
         estaciones,
@@ -93,73 +93,168 @@ elif seccion == 'Análisis espacial':
         title='Estaciones: color=NO2, tamaño=uso bici'
     )
     st.plotly_chart(fig_map, use_container_width=True)
+    st.subheader('Estaciones cercanas')
+    st.info('Estaciones de Valenbisi y de calidad del aire dentro de un radio alrededor de una estación de Valenbisi.')
+    col1, col2 = st.columns(2)
+    est_ref = col1.selectbox('Estación de referencia', cube['station_ids'], key='est_ref')
+    radio = col2.slider('Radio (m)', 100, 3000, 500, step=100)
+    indice = data.stations_index()
+    cercanas = indice.radius(*indice.locate(est_ref), radio)
+    cercanas = cercanas[~((cercanas['kind'] == 'bike') & (cercanas['station_id'] == est_ref))]
+    st.dataframe(cercanas[['kind', 'station_id', 'dist_m']].rename(
+        columns={'kind': 'Tipo', 'station_id': 'Estación', 'dist_m': 'Distancia (m)'}),
+        hide_index=True, use_container_width=True)
     st.subheader('Top 5 estaciones NO2')
     st.info('Estaciones con mayor concentración media de NO₂.')
-    top5_no2 = estaciones.nlargest(5, 'NO2')
+    top5_no2 = cube['top5_NO2']
     fig_bar_no2 = px.bar(top5_no2, x='codigo_estacion', y='NO2', color='NO2', title='Top 5 NO2')
     st.plotly_chart(fig_bar_no2, use_container_width=True)
     st.subheader('Top 5 estaciones uso bici')
     st.info('Estaciones con mayor uso medio de Valenbisi.')
-    top5_bike = estaciones.nlargest(5, 'prestamos_mean')
+    top5_bike = cube['top5_bike']
     fig_bar_bike = px.bar(top5_bike, x='codigo_estacion', y='prestamos_mean', color='prestamos_mean', title='Top 5 uso bici')
     st.plotly_chart(fig_bar_bike, use_container_width=True)
     st.subheader('Selecciona una estación para ver detalles')
     st.info('Consulta la evolución horaria de la contaminación y el uso de la bici en una estación concreta.')
-    est_sel = st.selectbox('Estación', sorted(estaciones['codigo_estacion'].unique()))
-    df_est = spatial[spatial['codigo_estacion'] == est_sel]
+    est_sel = st.selectbox('Estación', cube['station_ids'])
+    df_est = data.station_hour(est_sel, anio)
     fig_est = px.line(df_est, x='hour', y=['NO2','prestamos_mean'], labels={'value':'Valor','hour':'Hora','variable':'Variable'}, title=f'Evolución horaria estación {est_sel}')
     st.plotly_chart(fig_est, use_container_width=True)
+    ajuste = cube['ols_station'].loc[est_sel]
+    col1, col2 = st.columns(2)
+    col1.metric('Pendiente NO₂ ~ préstamos', f"{ajuste['coef_prestamos_mean']:.3f}")
+    col2.metric('R²', f"{ajuste['r2']:.3f}")
 
 # --- Sección: Correlaciones y modelos ---
 elif seccion == 'Correlaciones y modelos':
     st.header('Correlaciones y modelos')
     st.info('Analiza la relación entre las variables y elabora modelos predictivos simples.')
     st.subheader('Matriz de correlación')
-    columnas = ['NO2','PM10','PM2_5','NOx','O3','Veloc','Temp','bike_trips']
-    columnas_existentes = [col for col in columnas if col in city.columns]
-    corr = city[columnas_existentes].corr()
-    fig_corr = px.imshow(corr, text_auto=True, color_continuous_scale='RdBu', zmin=-1, zmax=1)
+    metodo = st.radio('Método', ['Pearson', 'Spearman'], horizontal=True)
+    matriz = cube['corr'] if metodo == 'Pearson' else cube['spearman']
+    fig_corr = px.imshow(matriz, text_auto=True, color_continuous_scale='RdBu', zmin=-1, zmax=1)
     st.plotly_chart(fig_corr, use_container_width=True)
     st.subheader('Relación NO₂ vs Viajes en Bici')
     st.info('Visualiza la relación directa entre el uso de la bici y la contaminación por NO₂.')
-    fig_scatter = px.scatter(city, x='bike_trips', y='NO2', trendline='ols', opacity=0.6,
+    city = data.city(anio, columns=['bike_trips', 'NO2'])
+    fig_scatter = px.scatter(city, x='bike_trips', y='NO2', opacity=0.6,
                             labels={'bike_trips':'Viajes en Bici','NO2':'NO₂'})
+    recta = cube['models']['NO2_bike']
+    x_rango = [city['bike_trips'].min(), city['bike_trips'].max()]
+    fig_scatter.add_scatter(x=x_rango, y=[recta['intercept'] + recta['coef'][0] * x for x in x_rango],
+                            mode='lines', name=f"MCO (R²={recta['r2']:.3f})")
     st.plotly_chart(fig_scatter, use_container_width=True)
     st.subheader('Regresión lineal: NO₂ ~ bike_trips + Veloc + Temp')
     st.info('Modelo predictivo sencillo para estimar NO₂ a partir del uso de la bici, la velocidad del viento y la temperatura.')
-    X = city[['bike_trips','Veloc','Temp']]
-    y = city['NO2']
-    reg = LinearRegression().fit(X, y)
+    reg = cube['models']['NO2_lineal']
     col1, col2 = st.columns(2)
-    col1.metric('Intercept', f"{reg.intercept_:.2f}")
-    col2.metric('R²', f"{reg.score(X, y):.4f}")
+    col1.metric('Intercept', f"{reg['intercept']:.2f}")
+    col2.metric('R²', f"{reg['r2']:.4f}")
     col3, col4, col5 = st.columns(3)
-    col3.metric('Coef bike_trips', f"{reg.coef_[0]:.4f}")
-    col4.metric('Coef Veloc', f"{reg.coef_[1]:.4f}")
-    col5.metric('Coef Temp', f"{reg.coef_[2]:.4f}")
+    col3.metric('Coef bike_trips', f"{reg['coef'][0]:.4f}")
+    col4.metric('Coef Veloc', f"{reg['coef'][1]:.4f}")
+    col5.metric('Coef Temp', f"{reg['coef'][2]:.4f}")
+    st.subheader('Regresión por mes')
+    st.info('El mismo modelo ajustado por separado para cada mes.')
+    por_mes = cube['ols_month']
+    fig_mes = px.line(por_mes, y=['coef_bike_trips', 'r2'], markers=True,
+                      labels={'value':'Valor','month':'Mes','variable':'Variable'})
+    st.plotly_chart(fig_mes, use_container_width=True)
+
+    st.subheader('Respuesta con retardo (0–48 h)')
+    st.info('Correlación entre los viajes en bici en una hora y la contaminación medida entre 0 y 48 horas después, por estación de aire.')
+    retardos = data.lags(anio)
+    if retardos is None:
+        st.warning('Faltan las tablas de retardos: ejecuta el pipeline (etapa `lags`).')
+    elif retardos['lag_bike'].empty:
+        st.warning('Ninguna estación de aire midió NO₂ este año: no hay retardos que mostrar.')
+    else:
+        var_lag = st.radio('Contaminante', ['NO2', 'PM10', 'PM2_5'], horizontal=True, key='var_lag',
+                           format_func=lambda v: v.replace('_', '.'))
+        lag_aire = retardos['lag_air'][retardos['lag_air']['variable'] == var_lag]
+        fig_lag = px.line(lag_aire.astype({'station_id': str}), x='lag', y='r', color='station_id',
+                          labels={'lag':'Retardo (h)','r':'Correlación','station_id':'Estación'})
+        st.plotly_chart(fig_lag, use_container_width=True)
+        st.subheader('Correlación móvil NO₂ ~ bici (ventana de 7 días)')
+        col1, col2 = st.columns(2)
+        est_aire = col1.selectbox('Estación de aire', sorted(retardos['lag_air'].loc[
+            retardos['lag_air']['variable'] == 'NO2', 'station_id'].unique()))
+        movil = downsample.series(data.rolling_air(anio, est_aire), ['NO2_bike_corr', 'NO2_mean'], x='datetime')
+        fig_movil = px.line(movil, x='datetime', y='NO2_bike_corr',
+                            labels={'datetime':'Fecha','NO2_bike_corr':'Correlación'})
+        st.plotly_chart(fig_movil, use_container_width=True)
+        # Por estación bici: serie estimada frente al NO2 de su estación de aire más cercana
+        lag_bici = retardos['lag_bike']
+        est_bici = col2.selectbox('Estación bici', sorted(lag_bici['codigo_estacion'].unique()))
+        fila = lag_bici[lag_bici['codigo_estacion'] == est_bici]
+        cercana = int(fila['nearest_no2_station'].iloc[0])
+        col3, col4 = st.columns(2)
+        fig_lag_bici = px.line(fila, x='lag', y='r', title=f'Estación {est_bici} ↔ aire {cercana}',
+                               labels={'lag':'Retardo (h)','r':'Correlación'})
+        col3.plotly_chart(fig_lag_bici, use_container_width=True)
+        movil_bici = downsample.series(data.bike_rolling(anio, est_bici, cercana), ['NO2_bike_corr'], x='datetime')
+        fig_movil_bici = px.line(movil_bici, x='datetime', y='NO2_bike_corr', title='Correlación móvil (7 días)',
+                                 labels={'datetime':'Fecha','NO2_bike_corr':'Correlación'})
+        col4.plotly_chart(fig_movil_bici, use_container_width=True)
 
 # --- Sección: Comparativas ---
 elif seccion == 'Comparativas':
     st.header('Comparativas')
-    st.info('Compara la contaminación y el uso de la bici entre días laborables y fines de semana, y filtra por mes.')
+    st.info('Compara la contaminación y el uso de la bici entre días laborables y fines de semana, y filtra por mes y franja horaria.')
     # Filtro por mes
-    meses = sorted(city['month'].unique())
-    mes_sel = st.selectbox('Selecciona mes', options=['Todos'] + [str(m) for m in meses], index=0)
-    if mes_sel != 'Todos':
-        df_comp = city[city['month'] == int(mes_sel)]
+    meses = sorted(m for m in cube['box_weekend']['month'].unique() if m)
+    col1, col2 = st.columns(2)
+    mes_sel = col1.selectbox('Selecciona mes', options=['Todos'] + [str(m) for m in meses], index=0)
+    horas = col2.slider('Horas', 0, 23, (0, 23))
+    mes = 0 if mes_sel == 'Todos' else int(mes_sel)
+    if horas == (0, 23):
+        # Cajas precalculadas por mes × finde (mes 0 = todos los meses)
+        cajas = cube['box_weekend'][cube['box_weekend']['month'] == mes]
+        outliers = cube['box_weekend_out'][cube['box_weekend_out']['month'] == mes]
     else:
-        df_comp = city.copy()
+        # Franja horaria: sólo las filas del filtro (consulta SQL) y cajas al vuelo
+        filas = data.city(anio, month=mes, hours=horas, columns=['is_weekend', 'NO2', 'bike_trips'])
+        cajas, outliers = downsample.box_stats(filas, ['is_weekend'], ['NO2', 'bike_trips'])
     # Boxplot NO2 laborables vs finde
     st.subheader('NO₂: Laborables vs. Finde')
-    fig_box_no2 = px.box(df_comp, x='is_weekend', y='NO2', points='all',
-                        labels={'is_weekend':'¿Finde? (0=Laborable, 1=Finde)','NO2':'NO₂'})
+    fig_box_no2 = downsample.box_figure(cajas, outliers, 'is_weekend', 'NO2',
+                        {'is_weekend':'¿Finde? (0=Laborable, 1=Finde)','NO2':'NO₂'})
     st.plotly_chart(fig_box_no2, use_container_width=True)
     # Boxplot bike_trips laborables vs finde
     st.subheader('Viajes bici: Laborables vs. Finde')
-    fig_box_bike = px.box(df_comp, x='is_weekend', y='bike_trips', points='all',
-                        labels={'is_weekend':'¿Finde? (0=Laborable, 1=Finde)','bike_trips':'Viajes bici'})
+    fig_box_bike = downsample.box_figure(cajas, outliers, 'is_weekend', 'bike_trips',
+                        {'is_weekend':'¿Finde? (0=Laborable, 1=Finde)','bike_trips':'Viajes bici'})
     st.plotly_chart(fig_box_bike, use_container_width=True)
 
+# --- Sección: Disponibilidad en directo ---
+elif seccion == 'Disponibilidad en directo':
+    st.header('Disponibilidad en directo')
+    st.info('Bicis y anclajes libres en cada estación según la última foto del feed de Valenbisi (`python availability.py poll`).')
+
+    # Sólo se vuelve a dibujar este bloque, cada LIVE_REFRESH segundos
+    @st.fragment(run_every=data.LIVE_REFRESH)
+    def estado_actual():
+        estado = data.live_status()
+        if estado is None:
+            st.warning('Todavía no hay datos en directo: lanza `python availability.py poll`.')
+            return
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric('Bicis disponibles', f"{estado['available'].sum():,d}")
+        col2.metric('Anclajes libres', f"{estado['free'].sum():,d}")
+        col3.metric('Estaciones vacías', f"{(estado['available'] == 0).sum()}")
+        col4.metric('Estaciones llenas', f"{(estado['free'] == 0).sum()}")
+        st.caption(f"Última foto: {estado['updated'].max().tz_convert('Europe/Madrid'):%d/%m/%Y %H:%M:%S}")
+        fig_live = px.scatter_mapbox(
+            estado.assign(ocupacion=estado['available'] / estado['total'].clip(lower=1)),
+            lat='lat', lon='lon', color='ocupacion', size='total',
+            hover_name='station', hover_data=['available', 'free'],
+            color_continuous_scale='RdYlGn', range_color=(0, 1), size_max=15, zoom=12,
+            mapbox_style='carto-positron', title='Estaciones: color=bicis / anclajes'
+        )
+        st.plotly_chart(fig_live, use_container_width=True)
+
+    estado_actual()
+
 # Footer con nombres
 st.markdown(
     '''
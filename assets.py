@@ -0,0 +1,37 @@
+"""
+assets.py
+---------
+Imágenes del dashboard redimensionadas una vez y servidas desde static/.
+
+El favicon y la cabecera originales (logo.png 1024 px, favicon.png 3072 px,
+~1,9 MB juntos) se reducen al tamaño con el que se muestran (×2 para
+pantallas HiDPI) y se guardan como static/<nombre>_<ancho>.png, que va
+versionado: en un arranque en frío sólo se lee un PNG pequeño. Si cambia un
+original, `python assets.py` vuelve a generar las copias.
+"""
+from __future__ import annotations
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+STATIC = ROOT / "static"
+# original → ancho servido (px)
+SIZES = {"logo.png": 64, "favicon.png": 1200}
+
+
+def resized(name: str, width: int | None = None, force: bool = False) -> Path:
+    """Ruta de `name` redimensionado a `width` px de ancho (lo genera si falta)."""
+    src = ROOT / name
+    width = width or SIZES[name]
+    out = STATIC / f"{src.stem}_{width}.png"
+    if force or not out.exists():
+        from PIL import Image
+        with Image.open(src) as im:
+            h = round(im.height * width / im.width)
+            STATIC.mkdir(exist_ok=True)
+            im.resize((width, h), Image.LANCZOS).save(out, optimize=True)
+    return out
+
+
+if __name__ == "__main__":
+    for name in SIZES:
+        print(resized(name, force=True))
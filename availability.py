@@ -0,0 +1,329 @@
+"""
+availability.py
+---------------
+Ingesta en directo de la disponibilidad de Valenbisi (bicis y anclajes
+libres por estación).
+
+El dataset de disponibilidad que bike_geo() usa para las coordenadas es un
+feed en directo. `poll` lo descarga cada `--interval` segundos (petición
+condicional: si el ETag no cambió no se baja nada) y sólo guarda los
+cambios: una fila (ts, station, available, free) por estación cuyo estado
+cambió desde la foto anterior; la primera foto de cada arranque entra
+completa.
+
+Los cambios van a un RingBuffer: un array NumPy estructurado de capacidad
+fija (16 bytes por fila) acotado en el tiempo (`horizon`). Cada
+`compact_every` segundos lo pendiente se compacta a Parquet en
+data/availability/deltas/year=<año>/ y sólo entonces puede sobrescribirse o
+caducar; si el buffer se llena antes, se compacta en ese momento.
+
+Tras cada foto el estado actual (estación, disponibles, libres, total,
+lat/lon, hora) se reescribe de forma atómica en
+data/availability/current.parquet: unas 300 filas que el dashboard lee en
+milisegundos (`read_status`). `history` y `status_at` reconstruyen el
+estado pasado a partir de los cambios compactados.
+
+Para probar sin red, `replay` sirve por HTTP fotos grabadas (`poll --record
+DIR` guarda cada foto que cambia) imitando la API de Opendatasoft:
+
+    python availability.py replay data/availability/snapshots --port 8765
+    python availability.py poll --base-url http://127.0.0.1:8765 --interval 5
+"""
+from __future__ import annotations
+import argparse, hashlib, io, os, time, warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import requests
+import fetcher, storage
+
+DATASET = "valenbisi-disponibilitat-valenbisi-dsiponibilidad"
+LIVE_DIR = storage.DATA_DIR / "availability"
+INTERVAL = 60                                        # s entre fotos
+HORIZON = 24 * 3600                                  # s de cambios en memoria
+COMPACT_EVERY = 15 * 60                              # s entre compactaciones
+CAPACITY = 1 << 19                                   # filas (8 MiB): ~1 día a 1 foto/min
+
+DTYPE = np.dtype([("ts", "i8"), ("station", "i4"), ("available", "i2"), ("free", "i2")])
+
+
+class RingBuffer:
+    """Filas DTYPE en un array de capacidad fija, en orden de llegada.
+
+    Las posiciones son una secuencia global: la fila i vive en i % capacity.
+    [start, end) es lo que hay en memoria y [flushed, end) lo que falta por
+    compactar, que nunca se sobrescribe ni caduca.
+    """
+
+    def __init__(self, capacity: int = CAPACITY, horizon: int = HORIZON):
+        self.data = np.zeros(capacity, DTYPE)
+        self.capacity, self.horizon = capacity, horizon
+        self.start = self.end = self.flushed = 0
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def room(self) -> int:
+        """Filas que caben sin perder nada sin compactar."""
+        return self.capacity - (self.end - self.flushed)
+
+    def append(self, rows: np.ndarray) -> None:
+        k = len(rows)
+        if k > self.room():
+            raise BufferError(f"{k} filas y sólo caben {self.room()}: compacta antes")
+        self.data[(self.end + np.arange(k)) % self.capacity] = rows
+        self.end += k
+        self.start = max(self.start, self.end - self.capacity)
+
+    def view(self, lo: int | None = None, hi: int | None = None) -> np.ndarray:
+        """Copia ordenada de las filas [lo, hi) (por defecto, todas las de memoria)."""
+        lo = self.start if lo is None else max(lo, self.start)
+        hi = self.end if hi is None else min(hi, self.end)
+        return self.data[np.arange(lo, hi) % self.capacity] if hi > lo else self.data[:0].copy()
+
+    def pending(self) -> np.ndarray:
+        return self.view(self.flushed)
+
+    def mark_flushed(self) -> None:
+        self.flushed = self.end
+
+    def since(self, ts: int) -> np.ndarray:
+        """Filas en memoria con ts >= `ts` (los ts llegan en orden)."""
+        rows = self.view()
+        return rows[np.searchsorted(rows["ts"], ts):]
+
+    def trim(self, now: int) -> None:
+        """Descarta lo anterior a now - horizon que ya esté compactado."""
+        ts = self.view(self.start, self.flushed)["ts"]
+        self.start += int(np.searchsorted(ts, now - self.horizon))
+
+
+# ───────── fotos del feed ─────────
+def parse_snapshot(content: bytes) -> pd.DataFrame:
+    """Export CSV del feed → station, available, free, total, lat, lon, open."""
+    df = pd.read_csv(io.BytesIO(content), sep=";", encoding="utf-8-sig",
+                     usecols=["number", "open", "available", "free", "total", "geo_point_2d"])
+    lat_lon = df["geo_point_2d"].str.split(",", expand=True).astype(float)
+    return pd.DataFrame({"station": df["number"].astype("int32"),
+                         "available": df["available"].astype("int16"),
+                         "free": df["free"].astype("int16"),
+                         "total": df["total"].astype("int16"),
+                         "lat": lat_lon[0], "lon": lat_lon[1],
+                         "open": df["open"].eq("T")}).drop_duplicates("station")
+
+
+class Live:
+    """Estado actual + cambios en un RingBuffer, compactados a Parquet."""
+
+    def __init__(self, capacity: int = CAPACITY, horizon: int = HORIZON,
+                 out_dir: Path = LIVE_DIR):
+        self.buf = RingBuffer(capacity, horizon)
+        self.out_dir = Path(out_dir)
+        self.state: pd.DataFrame | None = None       # última foto, indexada por estación
+
+    def ingest(self, snap: pd.DataFrame, ts: int) -> int:
+        """Añade la foto tomada en `ts` (epoch s); devuelve nº de cambios."""
+        cur = snap.set_index("station")
+        if self.state is None:
+            changed = np.ones(len(cur), bool)
+        else:
+            prev = self.state.reindex(cur.index)
+            changed = ((prev["available"] != cur["available"])
+                       | (prev["free"] != cur["free"])).to_numpy()   # nuevas: NaN ≠ x
+        rows = np.empty(int(changed.sum()), DTYPE)
+        rows["ts"] = ts
+        rows["station"] = cur.index.to_numpy()[changed]
+        rows["available"] = cur["available"].to_numpy()[changed]
+        rows["free"] = cur["free"].to_numpy()[changed]
+        if len(rows) > self.buf.room():
+            self.compact(ts)
+        self.buf.append(rows)
+        self.state = cur.assign(updated=pd.Timestamp(ts, unit="s", tz="UTC"))
+        write_status(self.state, self.out_dir)
+        return len(rows)
+
+    def compact(self, now: int | None = None) -> list[Path]:
+        """Escribe lo pendiente a deltas/year=<año>/ y libera el buffer."""
+        df = deltas_frame(self.buf.pending())
+        outs = []
+        for year, part in df.groupby(df["ts"].dt.year):
+            out = (self.out_dir / "deltas" / f"year={year}"
+                   / f"part-{int(part['ts'].iloc[0].timestamp())}-{self.buf.end}.parquet")
+            out.parent.mkdir(parents=True, exist_ok=True)
+            part.to_parquet(out, index=False, compression=storage.COMPRESSION)
+            outs.append(out)
+        self.buf.mark_flushed()
+        self.buf.trim(int(time.time()) if now is None else now)
+        return outs
+
+
+def deltas_frame(rows: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame({"ts": pd.to_datetime(rows["ts"], unit="s", utc=True),
+                         "station": rows["station"], "available": rows["available"],
+                         "free": rows["free"]})
+
+
+# ───────── estado actual e histórico ─────────
+def status_path(out_dir: Path = LIVE_DIR) -> Path:
+    return Path(out_dir) / "current.parquet"
+
+
+def write_status(state: pd.DataFrame, out_dir: Path = LIVE_DIR) -> Path:
+    """Reescribe el estado actual de forma atómica (el dashboard lo lee a la vez)."""
+    out = status_path(out_dir)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(".tmp")
+    state.reset_index().to_parquet(tmp, index=False)
+    os.replace(tmp, out)
+    return out
+
+
+def read_status(out_dir: Path = LIVE_DIR) -> pd.DataFrame | None:
+    """Estado actual por estación (None si el poller no ha escrito nada)."""
+    path = status_path(out_dir)
+    return pd.read_parquet(path) if path.exists() else None
+
+
+def _utc(t) -> pd.Timestamp:
+    """Instante en UTC. Un número son segundos epoch (como time.time() y los
+    ts del buffer); fechas y textos sin zona se toman como UTC."""
+    if isinstance(t, (int, float, np.integer, np.floating)) and not isinstance(t, bool):
+        return pd.Timestamp(t, unit="s", tz="UTC")
+    t = pd.Timestamp(t)
+    return t.tz_localize("UTC") if t.tz is None else t.tz_convert("UTC")
+
+
+def history(start=None, end=None, stations=None, out_dir: Path = LIVE_DIR) -> pd.DataFrame:
+    """Cambios compactados en [start, end), de `stations` si se indican
+    (start / end: fecha, texto ISO o segundos epoch, ver `_utc`)."""
+    root = Path(out_dir) / "deltas"
+    if not any(root.glob("year=*/*.parquet")):
+        return deltas_frame(np.empty(0, DTYPE))
+    filters = []
+    if start is not None: filters.append(("ts", ">=", _utc(start)))
+    if end is not None: filters.append(("ts", "<", _utc(end)))
+    if stations is not None: filters.append(("station", "in", list(stations)))
+    df = pd.read_parquet(root, filters=filters or None)
+    return df.drop(columns="year").sort_values("ts", kind="stable", ignore_index=True)
+
+
+def status_at(ts, out_dir: Path = LIVE_DIR) -> pd.DataFrame:
+    """Estado de cada estación en `ts` (fecha o segundos epoch): su último
+    cambio hasta ese momento."""
+    df = history(end=_utc(ts) + pd.Timedelta(seconds=1), out_dir=out_dir)
+    return df.groupby("station").last().reset_index()
+
+
+# ───────── poller ─────────
+def poll(interval: float = INTERVAL, compact_every: float = COMPACT_EVERY,
+         live: Live | None = None, record: Path | None = None,
+         max_polls: int | None = None) -> Live:
+    """Toma una foto cada `interval` s (sin deriva) hasta Ctrl-C o `max_polls`."""
+    live = live or Live()
+    url, etag, n = fetcher.url_for(DATASET), None, 0
+    t0 = time.monotonic()
+    next_compact = t0 + compact_every
+    try:
+        while max_polls is None or n < max_polls:
+            now = int(time.time())
+            try:
+                r = fetcher.session().get(url, headers={"If-None-Match": etag} if etag else {},
+                                          timeout=fetcher.TIMEOUT)
+                if r.status_code != 304:
+                    r.raise_for_status()
+                    etag = r.headers.get("ETag")
+                    changes = live.ingest(parse_snapshot(r.content), now)
+                    print(f"  {time.strftime('%H:%M:%S')} {changes:4d} cambios "
+                          f"({len(live.buf):,d} filas en memoria)")
+                    if record is not None:
+                        record.mkdir(parents=True, exist_ok=True)
+                        (record / f"{now}.csv").write_bytes(r.content)
+            except (requests.RequestException, ValueError) as e:
+                warnings.warn(f"foto fallida ({e.__class__.__name__}: {e}); se reintenta")
+            n += 1
+            if time.monotonic() >= next_compact:
+                live.compact()
+                next_compact += compact_every
+            if max_polls is None or n < max_polls:
+                time.sleep(max(0.0, t0 + n * interval - time.monotonic()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        live.compact()
+    return live
+
+
+# ───────── servidor local que reproduce fotos grabadas ─────────
+def serve_replay(snapshots: list[Path], port: int = 8765,
+                 host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Servidor HTTP que imita el export de DATASET: cada GET devuelve la
+    siguiente foto (la última se repite) con su ETag y responde 304 si no
+    cambió. Llamar a .serve_forever() (o en un hilo) y .shutdown()."""
+    bodies = [Path(p).read_bytes() for p in snapshots]
+    if not bodies:
+        raise FileNotFoundError("replay: no hay fotos que servir")
+    path = fetcher.EXPORT.format(DATASET).split("?")[0]
+    state = {"i": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != path:
+                self.send_error(404)
+                return
+            body = bodies[min(state["i"], len(bodies) - 1)]
+            state["i"] += 1
+            tag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+            if self.headers.get("If-None-Match") == tag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/csv; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", tag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):                # sin una línea por petición
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[3])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("poll", help="toma fotos del feed y guarda los cambios")
+    p.add_argument("--interval", type=float, default=INTERVAL, help="segundos entre fotos")
+    p.add_argument("--compact-every", type=float, default=COMPACT_EVERY,
+                   help="segundos entre compactaciones a Parquet")
+    p.add_argument("--horizon", type=int, default=HORIZON, help="segundos de cambios en memoria")
+    p.add_argument("--capacity", type=int, default=CAPACITY, help="filas del buffer")
+    p.add_argument("--max-polls", type=int, default=None, help="para tras N fotos")
+    p.add_argument("--record", type=Path, default=None, metavar="DIR",
+                   help="guarda cada foto que cambia (para `replay`)")
+    p.add_argument("--base-url", default=fetcher.BASE_URL,
+                   help="raíz de la API (p.ej. el servidor de `replay`)")
+    r = sub.add_parser("replay", help="sirve fotos grabadas imitando la API")
+    r.add_argument("snapshots", type=Path, help="directorio con las fotos .csv")
+    r.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "replay":
+        snaps = sorted(args.snapshots.glob("*.csv"))
+        server = serve_replay(snaps, args.port)
+        print(f"▶ Reproduciendo {len(snaps)} fotos en http://127.0.0.1:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+    fetcher.BASE_URL = args.base_url
+    print(f"▶ Disponibilidad cada {args.interval:g} s → {LIVE_DIR}")
+    poll(args.interval, args.compact_every, Live(args.capacity, args.horizon),
+         args.record, args.max_polls)
+
+
+if __name__ == "__main__":
+    main()
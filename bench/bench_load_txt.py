@@ -0,0 +1,88 @@
+"""
+bench_load_txt.py
+-----------------
+Compara el parser antiguo de los .txt de aire (read_csv con sep=r"\\s+" y
+to_datetime sobre cadenas) con air_parser.load_txt.
+
+Comprueba que ambos devuelven el mismo frame (mismas columnas, dtypes y
+valores en las filas sin huecos; en las filas con huecos el parser antiguo
+desplazaba columnas) y muestra el tiempo medio por fichero.
+
+Uso (desde la raíz del repo):
+    python bench/bench_load_txt.py [--repeat 5]
+"""
+from __future__ import annotations
+import argparse, re, sys, time
+from io import StringIO
+from pathlib import Path
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+from air_parser import ENCODING, DECIMAL, NA, load_txt  # noqa: E402
+
+AIR_DIR = ROOT / "air_txt"
+
+
+def load_txt_legacy(f: Path) -> pd.DataFrame:
+    """Implementación original de build_valencia_bike_air_2022.load_txt."""
+    rows=f.read_text(encoding=ENCODING).splitlines()
+    st_line=next(l for l in rows if l.startswith("Estación:"))
+    st_id,st_name=re.findall(r"Estación:\s*(\d+)-\s*(.+)",st_line)[0]
+    hdr_i=next(i for i,l in enumerate(rows) if l.lstrip().startswith("FECHA"))
+    hdr=re.split(r"\s+",rows[hdr_i].strip()); data=rows[hdr_i+2:]
+    df=pd.read_csv(StringIO(" ".join(hdr)+"\n"+"\n".join(data)),
+                   sep=r"\s+",decimal=DECIMAL,na_values=NA,encoding=ENCODING)
+    df["datetime"]=pd.to_datetime(df["FECHA"]+" "+df["HORA"].astype(str).str.zfill(2),
+                                  format="%d/%m/%Y %H")
+    df.drop(columns=["FECHA","HORA"],inplace=True)
+    df["station_id"],df["station_name"]=st_id,st_name.strip()
+    return df
+
+
+def complete_rows(f: Path) -> list[bool]:
+    """Filas de datos sin campos vacíos (donde ambos parsers deben coincidir)."""
+    lines = f.read_bytes().split(b"\n")
+    hdr_i = next(i for i, l in enumerate(lines) if l.lstrip().startswith(b"FECHA"))
+    data = [l for l in lines[hdr_i + 2:] if l.strip()]
+    return [b"\t\t" not in l and not l.endswith(b"\t") for l in data]
+
+
+def check(f: Path) -> None:
+    old, new = load_txt_legacy(f), load_txt(f)
+    assert list(old.columns) == list(new.columns), f.name
+    assert len(old) == len(new), f.name
+    ok = complete_rows(f)
+    pd.testing.assert_frame_equal(old[ok].reset_index(drop=True),
+                                  new[ok].reset_index(drop=True),
+                                  check_dtype=False)
+    # dtypes idénticos salvo donde el desplazamiento antiguo alteraba la columna
+    assert new["datetime"].dtype == old["datetime"].dtype, f.name
+
+
+def timeit(fn, files, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for f in files:
+            fn(f)
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    files = sorted(AIR_DIR.glob("*.txt"))
+    for f in files:
+        check(f)
+    print(f"✔ {len(files)} ficheros: mismo frame en filas completas")
+
+    t_old = timeit(load_txt_legacy, files, args.repeat)
+    t_new = timeit(load_txt, files, args.repeat)
+    n = len(files)
+    print(f"  legacy     {t_old / n * 1e3:7.1f} ms/fichero")
+    print(f"  air_parser {t_new / n * 1e3:7.1f} ms/fichero")
+    print(f"  speedup    ×{t_old / t_new:.1f}")
@@ -0,0 +1,254 @@
+"""
+run_benchmarks.py
+-----------------
+Benchmarks de las etapas del ETL y de la carga de datos del dashboard.
+
+Para cada escala (1× = ficheros del repo; 10×, 100× = estaciones
+sintéticas y años anteriores generados a partir de ellos) se prepara un directorio de trabajo
+temporal con air_txt/ y data/raw/, y cada etapa se ejecuta en un proceso
+nuevo, en orden, reutilizando las salidas de la anterior:
+
+    load_txt  bike_city  bike_station_hour  air_data  city_merge
+    crosswalk  cube  dashboard_load  app_cold  app_rerun
+
+app_cold es el primer run de app.py en un proceso nuevo (imports de plotly,
+carga del cubo y de las imágenes: lo que ve el primer usuario tras escalar
+desde cero) y app_rerun, con el proceso ya caliente, un rerun de cada
+sección del dashboard (filas = secciones).
+
+Por etapa se mide tiempo de pared, pico de RSS del proceso y filas/s, y se
+compara con bench/baseline.json (una regresión > --tolerance devuelve
+código de salida 1).
+
+Uso (desde la raíz del repo):
+    python bench/run_benchmarks.py                    # escalas 1 y 10
+    python bench/run_benchmarks.py --scales 1 10 100
+    python bench/run_benchmarks.py --save-baseline
+"""
+from __future__ import annotations
+import argparse, json, os, shutil, subprocess, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+BASELINE = Path(__file__).with_name("baseline.json")
+STAGES = ["load_txt", "bike_city", "bike_station_hour", "air_data", "city_merge",
+          "crosswalk", "cube", "dashboard_load", "app_cold", "app_rerun"]
+SECTIONS = ["Resumen KPIs", "Análisis temporal", "Análisis espacial",
+            "Correlaciones y modelos", "Comparativas"]
+_app = None                                           # AppTest de app_cold (para app_rerun)
+
+
+# ───────── datos sintéticos ─────────
+def make_workspace(scale: int, seed: int = 0) -> Path:
+    """air_txt/ y data/raw/ con `scale` copias de cada estación: ids desplazados,
+    coordenadas con un pequeño jitter y la copia i en el año 2022 - i % 10 (a
+    partir de 10× hay varios años, y cada año se construye por separado)."""
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    ws = Path(tempfile.mkdtemp(prefix=f"bench_{scale}x_"))
+    (ws / "air_txt").mkdir()
+    (ws / "data" / "raw").mkdir(parents=True)
+    year_of = [2022 - i % 10 for i in range(scale)]
+
+    air_coords = pd.read_csv(ROOT / "data" / "raw" / "air_station_coords.csv")
+    coords = []
+    for i, year in enumerate(year_of):
+        for f in sorted((ROOT / "air_txt").glob("*_2022.txt")):
+            raw = f.read_bytes()
+            st = raw.split("Estación: ".encode("latin1"), 1)[1][:8]
+            new_id = str(int(st) + 100_000 * i).encode()
+            raw = raw.replace(st + b"-", new_id + b"-", 1)
+            if year != 2022:
+                raw = raw.replace(b"/2022\t", f"/{year}\t".encode())
+            stem = f.stem.removesuffix("_2022")
+            (ws / "air_txt" / f"{stem}{i:03d}_{year}.txt").write_bytes(raw)
+        c = air_coords.copy()
+        c["station_id"] += 100_000 * i
+        if i:
+            c[["lat", "lon"]] += rng.normal(0, 0.01, (len(c), 2))
+        coords.append(c)
+    pd.concat(coords).to_csv(ws / "data" / "raw" / "air_station_coords.csv", index=False)
+
+    hour = pd.read_csv(ROOT / "data" / "raw" / "raw_bike_hour_2022.csv", sep=";")
+    dev = pd.read_csv(ROOT / "data" / "raw" / "raw_bike_dev_2022.csv", sep=";")
+    geo = pd.read_csv(ROOT / "data" / "raw" / "raw_bike_geo.csv", sep=";")
+    latlon = geo["geo_point_2d"].str.split(",", expand=True).astype(float)
+    devs, geos = {}, []
+    for i, year in enumerate(year_of):
+        devs.setdefault(year, []).append(
+            dev.assign(codigo_estacion=dev["codigo_estacion"] + 1000 * i))
+        jit = rng.normal(0, 0.01, latlon.shape) if i else 0
+        ll = latlon + jit
+        geos.append(pd.DataFrame({"number": geo["number"] + 1000 * i,
+                                  "geo_point_2d": ll[0].astype(str) + ", " + ll[1].astype(str)}))
+    for year, parts in devs.items():
+        raw = ws / "data" / "raw"
+        pd.concat([hour] * len(parts)).to_csv(raw / f"raw_bike_hour_{year}.csv", sep=";", index=False)
+        pd.concat(parts).to_csv(raw / f"raw_bike_dev_{year}.csv", sep=";", index=False)
+    pd.concat(geos).to_csv(ws / "data" / "raw" / "raw_bike_geo.csv", sep=";", index=False)
+    return ws
+
+
+# ───────── etapas (se ejecutan dentro del proceso hijo) ─────────
+def run_stage(stage: str) -> int:
+    """Ejecuta `stage` para cada año del workspace (cwd) y devuelve nº de filas."""
+    import build_valencia_bike_air as b
+    import cube, fetcher, storage
+    fetcher.OFFLINE = True                            # sin red: sólo el espejo data/raw/
+    years = sorted({int(f.stem[-4:]) for f in b.AIR_DIR.glob("*.txt")})
+    if stage == "load_txt":
+        from air_parser import load_txt
+        return sum(len(load_txt(f)) for f in sorted(b.AIR_DIR.glob("*.txt")))
+    if stage == "app_cold":
+        global _app
+        from streamlit.testing.v1 import AppTest
+        _app = AppTest.from_file(str(ROOT / "app.py"), default_timeout=600)
+        _app.run()
+        assert not _app.exception, _app.exception
+        return 1
+    if stage == "app_rerun":
+        for sec in SECTIONS:
+            _app.sidebar.radio[0].set_value(sec)
+            _app.run()
+            assert not _app.exception, (sec, _app.exception)
+        return len(SECTIONS)
+    if stage == "crosswalk":                          # índice común: una vez
+        b.SHARED.force = True
+        idx = b.station_index()
+        b.SHARED.force = False
+    rows = 0
+    for y in years:
+        b.set_year(y, force=True)
+        if stage == "bike_city":
+            b.bike_city()
+            rows += sum(1 for _ in open(b.raw_path("bike_hour"), "rb")) - 1
+        elif stage == "bike_station_hour":
+            b.bike_station_hour()
+            rows += sum(1 for _ in open(b.raw_path("bike_dev"), "rb")) - 1
+        elif stage == "air_data":
+            rows += len(b.air_data(workers=1)[1])
+        elif stage == "city_merge":
+            bc = storage.read_table("bike_city_agg", year=y)
+            ac = storage.read_table("air_city_agg", year=y)
+            rows += len(b.city_merge(bc, ac))
+        elif stage == "crosswalk":
+            bs = storage.read_table("bike_station_hour", year=y)
+            af = storage.read_table("air_station_hour", year=y)
+            rows += len(b.crosswalk(bs, af, idx))
+        elif stage == "cube":
+            tables, models = cube.cube_from_tables(y)
+            cube.write_cube(tables, models, y)
+            rows += len(tables["city"]) + len(tables["station"])
+        elif stage == "dashboard_load":
+            import query
+            from station_index import load_index
+            c = cube.load_cube(y)
+            idx = load_index()
+            for st in c["station_ids"]:                # vecinos de cada estación
+                idx.query_radius(*idx.locate(st), 1000)
+            profile = query.station_hour(y, c["station_ids"][0])  # perfil de la estación elegida
+            rows += len(c["city"]) + len(c["station"]) + len(profile) + len(c["station_ids"])
+        else:
+            raise ValueError(stage)
+    return rows
+
+
+def child(stage: str, ws: str) -> None:
+    os.chdir(ws)
+    sys.path.insert(0, str(ROOT))
+    if stage.startswith("app_"):                      # el servidor ya tiene streamlit cargado
+        import streamlit.testing.v1  # noqa: F401
+        if stage == "app_rerun":
+            run_stage("app_cold")                     # calienta el proceso fuera de la medida
+    else:
+        import build_valencia_bike_air, cube, query, station_index  # noqa: F401  (imports fuera de la medida)
+    t = time.perf_counter()
+    rows = run_stage(stage)
+    wall = time.perf_counter() - t
+    print(json.dumps({"wall_s": wall, "rows": rows,
+                      "rows_per_s": rows / wall if wall else None,
+                      "peak_rss_mb": peak_rss_mb()}))
+
+
+def peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:                               # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+# ───────── orquestación ─────────
+def measure(stage: str, ws: Path, repeat: int) -> dict:
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, __file__, "--child", stage, str(ws)],
+                             capture_output=True, text=True, check=True)
+        res = json.loads(out.stdout.strip().splitlines()[-1])
+        if best is None or res["wall_s"] < best["wall_s"]:
+            best = res
+    return best
+
+
+def compare(results: dict, baseline: dict, tol: float,
+            floor: dict = {"wall_s": 0.05, "peak_rss_mb": 10}) -> list[str]:
+    """Métricas que empeoran más de `tol` (y más que el ruido `floor`)."""
+    bad = []
+    for key, r in results.items():
+        b = baseline.get(key)
+        if not b:
+            continue
+        for m in ("wall_s", "peak_rss_mb"):
+            if r.get(m) and b.get(m) and r[m] > max(b[m] * (1 + tol), b[m] + floor[m]):
+                bad.append(f"{key} {m}: {b[m]:.3f} → {r[m]:.3f} (+{r[m] / b[m] - 1:.0%})")
+    return bad
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmarks del ETL y del dashboard")
+    ap.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    ap.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    ap.add_argument("--repeat", type=int, default=3, help="mejor de N ejecuciones")
+    ap.add_argument("--tolerance", type=float, default=0.25,
+                    help="margen sobre el baseline antes de marcar regresión")
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--child", nargs=2, metavar=("STAGE", "WORKSPACE"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        child(*args.child)
+        return 0
+
+    results = {}
+    for scale in args.scales:
+        ws = make_workspace(scale)
+        try:
+            for stage in STAGES:                       # en orden: cada una deja sus salidas
+                res = measure(stage, ws, args.repeat if stage in args.stages else 1)
+                if stage in args.stages:
+                    results[f"{stage}@{scale}x"] = res
+                    print(f"{stage + '@' + str(scale) + 'x':26s} {res['wall_s']:8.3f} s "
+                          f"{res['peak_rss_mb'] or float('nan'):8.1f} MB "
+                          f"{res['rows_per_s'] or 0:12,.0f} filas/s")
+        finally:
+            shutil.rmtree(ws, ignore_errors=True)
+
+    if args.save_baseline:
+        base = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+        base.update(results)
+        BASELINE.write_text(json.dumps(base, indent=1, sort_keys=True))
+        print(f"baseline guardado en {BASELINE}")
+        return 0
+    if BASELINE.exists():
+        bad = compare(results, json.loads(BASELINE.read_text()), args.tolerance)
+        for line in bad:
+            print("✗ regresión", line)
+        if bad:
+            return 1
+        print("✔ sin regresiones respecto al baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+build_manifest.py
+-----------------
+Manifiesto de construcción incremental del pipeline.
+
+Guarda en data/build_manifest.json, para cada etapa, el hash sha256 de sus
+entradas y salidas y la versión del código que la construyó (VERSIONS, ver
+`code_version`). Una etapa sólo se vuelve a ejecutar si alguna entrada
+cambió, alguna salida falta o fue modificada a mano o cambió su código.
+
+Para que una reconstrucción sin cambios sea casi instantánea, el hash de
+cada fichero se reutiliza mientras su tamaño y mtime no cambien.
+
+Es seguro entre hilos (las etapas de un año corren en paralelo, ver dag.py).
+
+Las funciones de ON_RECORD reciben (etapa, salidas) cada vez que una etapa
+anota lo que escribió (runlog.py cuenta así ficheros y bytes por etapa).
+"""
+from __future__ import annotations
+import hashlib, inspect, json, os, threading
+from pathlib import Path
+
+CHUNK = 1 << 20                                      # 1 MiB por lectura
+ON_RECORD: list = []                                 # callbacks (etapa, salidas)
+VERSIONS: dict[str, str] = {}                        # etapa → huella de su código
+
+
+def file_hash(path: Path) -> str:
+    """sha256 del contenido de `path`, leído en bloques."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def code_version(*objs) -> str:
+    """Huella del código de `objs` (funciones o módulos): sha256 de su fuente."""
+    h = hashlib.sha256()
+    for o in objs:
+        h.update(inspect.getsource(o).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+class Manifest:
+    """Registro persistente de hashes por etapa."""
+
+    def __init__(self, path: Path, force: bool = False):
+        self.path = Path(path)
+        self.force = force
+        self._lock = threading.RLock()
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+        self.stages: dict[str, dict] = data.get("stages", {})
+        self.files: dict[str, dict] = data.get("files", {})
+
+    # ── hashing con caché por (size, mtime) ──
+    def digest(self, path: Path) -> str | None:
+        path = Path(path)
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        key = path.as_posix()
+        rec = self.files.get(key)
+        if rec and rec["size"] == st.st_size and rec["mtime_ns"] == st.st_mtime_ns:
+            return rec["sha256"]
+        sha = file_hash(path)
+        with self._lock:
+            self.files[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha}
+        return sha
+
+    def _hashes(self, paths) -> dict[str, str | None]:
+        return {Path(p).as_posix(): self.digest(p) for p in paths}
+
+    # ── API por etapa ──
+    def fresh(self, stage: str, inputs, outputs=None) -> bool:
+        """True si `stage` ya se construyó con estas mismas entradas y el mismo
+        código (VERSIONS) y sus salidas siguen intactas en disco.
+
+        outputs=None usa las salidas anotadas en la última ejecución (para
+        etapas cuyo nº de ficheros depende de los datos)."""
+        if self.force:
+            return False
+        rec = self.stages.get(stage)
+        if rec is None or rec.get("version") != VERSIONS.get(stage):
+            return False
+        outs = self._hashes(rec["outputs"] if outputs is None else outputs)
+        if None in outs.values():
+            return False
+        return rec["inputs"] == self._hashes(inputs) and rec["outputs"] == outs
+
+    def record(self, stage: str, inputs, outputs) -> None:
+        """Anota las entradas y salidas de `stage` tras ejecutarla."""
+        rec = {"inputs": self._hashes(inputs), "outputs": self._hashes(outputs),
+               "version": VERSIONS.get(stage)}
+        with self._lock:
+            self.stages[stage] = rec
+            self.save()
+        for hook in ON_RECORD:
+            hook(stage, list(outputs))
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with self._lock:
+            tmp.write_text(json.dumps({"stages": self.stages, "files": self.files},
+                                      indent=1, sort_keys=True), encoding="utf-8")
+            os.replace(tmp, self.path)
@@ -0,0 +1,515 @@
+"""
+build_valencia_bike_air.py
+--------------------------
+Pipeline completo: Valenbisi + Calidad del aire (Valencia), por año.
+
+Entradas: exports de Valenbisi de cada año (espejo en data/raw/, ver
+fetcher.py) y air_txt/<estación>_<año>.txt.
+
+Salida (Parquet tipado y particionado por año, data/<tabla>/year=<año>/,
+ver storage.py; con --csv también data/<tabla>_<año>.csv):
+  bike_city_agg           (mes × día_semana × hora)
+  air_city_agg
+  city_bike_air           (merge global)
+  bike_station_hour       (estación bici × hora)
+  air_station_hour        (estación aire × hora)
+  stations_crosswalk      (bici ↔ aire más cercana + distancia km)
+  bike_air_spatial_hour   (bici × hora + NO2/PM10/PM2.5 por IDW)
+  air_hourly/             (serie horaria completa por estación, timeseries.py)
+  bike_city_hourly        (viajes estimados por hora del calendario)
+  cube/                   (agregados precalculados del dashboard, cube.py)
+  lag_air, lag_bike       (correlación cruzada bici → aire, lag 0-48 h, lagged.py)
+  rolling_air             (NO2 y su correlación con la bici en ventana móvil)
+  validation_<año>.json   (informe de calidad de datos, validation.py)
+Comunes a todos los años:
+  data/bike_station_coords          (estación bici + lat/lon)
+  data/station_index.pkl            (KD-trees bici + aire, station_index.py)
+  data/build_manifest[_<año>].json  (hashes de entradas/salidas por etapa)
+
+Cada etapa sólo se recalcula si cambió alguna de sus entradas (ver
+build_manifest.py); si no, se reutiliza la salida ya escrita en disco.
+
+Las etapas forman un grafo de dependencias (dag.py) y las independientes
+corren a la vez, así que el tiempo total es el del camino crítico: las
+descargas en hilos, el índice común en cuanto están las coordenadas y cada
+año en su propio proceso (--jobs) en cuanto están sus exports. Dentro del
+año:
+
+  bike_city, bike_station_hour, air_data    a la vez
+  → validate                               corta antes de las lentas
+  → city_merge, hourly, crosswalk, lags    a la vez
+  → cube                                   (city_merge + crosswalk)
+
+--only ETAPA … ejecuta sólo esas etapas y --from ETAPA esa y las que
+dependen de ella; lo que necesiten de las demás se lee de disco.
+
+Requisitos:
+    pip install pandas pyarrow requests scipy tqdm python-dateutil
+    (opcional: pyinstrument, para --profile pyinstrument)
+Uso:
+    python build_valencia_bike_air.py [--year 2022 2023 …] [--jobs N]
+                                      [--only ETAPA … | --from ETAPA]
+                                      [--force] [--workers N] [--csv]
+                                      [--offline] [--base-url URL]
+                                      [--log FICHERO] [--profile cprofile|pyinstrument]
+                                      [--profile-stage ETAPA …]
+
+Cada etapa deja una línea en data/run_log.jsonl (tiempos, CPU, memoria,
+filas y bytes escritos, ver runlog.py).
+"""
+from __future__ import annotations
+import argparse, os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import air_parser, analytics, cube, dag, downsample, fetcher, lagged, runlog, storage, timeseries
+import validation, valenbisi_raw
+from air_parser import load_txt
+from build_manifest import VERSIONS, Manifest, code_version
+from fetcher import fetch
+from station_index import AIR_COORD, StationIndex, index_path, load_index
+from runlog import stage
+from storage import POLLUTANTS, read_table, write_table
+from valenbisi_raw import read_raw
+
+# ───────────── paths & ids ─────────────
+DATA_DIR  = Path("data"); DATA_DIR.mkdir(exist_ok=True)
+AIR_DIR   = Path("air_txt")                           # <estación>_<año>.txt horarios
+YEAR      = 2022                                      # año en construcción (set_year)
+CHUNK_ROWS = 500_000                                  # filas por bloque del export por estación
+SHARED    = Manifest(DATA_DIR / "build_manifest.json")          # etapas comunes
+MANIFEST  = Manifest(DATA_DIR / f"build_manifest_{YEAR}.json")  # etapas del año
+
+VAL_IDS = {
+    "bike_hour" : "valenbici-{year}-alquileres-por-mes-dia-hora",
+    "bike_dev"  : "valenbisi-{year}-alquileres-y-devoluciones",
+    "bike_geo"  : "valenbisi-disponibilitat-valenbisi-dsiponibilidad",
+}
+YEARLY = ["bike_hour", "bike_dev"]                    # un export por año
+
+def dataset_id(key:str, year:int|None=None)->str:
+    return VAL_IDS[key].format(year=year or YEAR)
+
+def raw_path(key:str, year:int|None=None)->Path:
+    """Fichero del export `key` en el espejo local (por año si es anual)."""
+    suffix=f"_{year or YEAR}" if key in YEARLY else ""
+    return fetcher.RAW_DIR/f"raw_{key}{suffix}.csv"
+
+def set_year(year:int, force:bool=False)->None:
+    """Apunta las etapas anuales (tablas y manifiesto) a `year`."""
+    global YEAR, MANIFEST
+    YEAR=year; MANIFEST=Manifest(DATA_DIR/f"build_manifest_{year}.json",force=force)
+    runlog.CONTEXT["year"]=year
+
+# ───────── helpers ─────────
+def days_in_year(year:int)->int:
+    return pd.Timestamp(year=year,month=12,day=31).dayofyear
+
+@stage("bike_city")
+def bike_city()->pd.DataFrame:
+    raw=fetch(dataset_id("bike_hour"),raw_path("bike_hour"))
+    name="bike_city_agg"
+    if MANIFEST.fresh("bike_city",[raw],storage.paths(name,YEAR)): return read_table(name,year=YEAR)
+    df=read_raw(raw,"bike_hour")              # month/dow/hour ya en int8
+    out=(df.groupby(["month","dow","hour"],as_index=False)
+           .agg(bike_trips=("suma_numero_viajes","sum"),
+                bike_dur_tot=("suma_duracion_total_viajes","sum")))
+    MANIFEST.record("bike_city",[raw],write_table(out,name,YEAR))
+    return out
+
+@stage("bike_station_hour")
+def bike_station_hour(chunksize: int = CHUNK_ROWS) -> pd.DataFrame:
+    """Media diaria de préstamos/devoluciones por estación × hora.
+
+    El export se lee por bloques y se acumulan sumas parciales por
+    (estación, hora), así que la memoria no crece con los años de datos. Los
+    días del promedio son, por estación, las fechas en que aparece si el
+    export trae `fecha` (una estación que sólo reporta parte del año no se
+    diluye); si no (2022 sólo trae totales), los días naturales de YEAR.
+    """
+    raw = fetch(dataset_id("bike_dev"), raw_path("bike_dev"))
+    name = "bike_station_hour"
+    if MANIFEST.fresh("bike_station_hour", [raw], storage.paths(name, YEAR)):
+        return read_table(name, year=YEAR)
+
+    agg, seen = None, []
+    for chunk in read_raw(raw, "bike_dev", chunksize=chunksize):
+        part = (chunk.groupby(["codigo_estacion", "hour"])
+                     .agg(prestamos_sum=("numero_de_prestamos", "sum"),
+                          devol_sum    =("numero_de_devoluciones", "sum")))
+        agg = part if agg is None else pd.concat([agg, part]).groupby(level=[0, 1]).sum()
+        if "fecha" in chunk:                      # (estación, día) observados
+            seen.append(chunk[["codigo_estacion", "fecha"]].dropna().drop_duplicates())
+    agg = agg.reset_index()
+    n_days = days_in_year(YEAR)
+    if seen:
+        per_station = (pd.concat(seen).astype({"fecha": str})
+                         .groupby("codigo_estacion")["fecha"].nunique())
+        n_days = (agg["codigo_estacion"].map(per_station)
+                    .fillna(days_in_year(YEAR)).to_numpy("float64"))
+
+    # Promedio diario (dividir solo las métricas)
+    agg["prestamos_mean"] = agg["prestamos_sum"] / n_days
+    agg["devol_mean"]     = agg["devol_sum"]     / n_days
+    agg = agg.drop(columns=["prestamos_sum", "devol_sum"])
+
+    MANIFEST.record("bike_station_hour", [raw], write_table(agg, name, YEAR))
+    return agg
+
+
+@stage("bike_geo")
+def bike_geo() -> pd.DataFrame:
+    """
+    Descarga el dataset de disponibilidad y extrae (común a todos los años):
+        codigo_estacion (int), lat, lon
+    """
+    raw = fetch(dataset_id("bike_geo"), raw_path("bike_geo"))
+    name = "bike_station_coords"
+    if SHARED.fresh("bike_geo", [raw], storage.paths(name)):
+        return read_table(name)
+    df = pd.read_csv(raw, sep=";")
+
+    # geo_point_2d → 2 columnas
+    lat_lon = df["geo_point_2d"].str.split(",", expand=True).astype(float)
+    df["lat"], df["lon"] = lat_lon[0], lat_lon[1]
+
+    # id numérico
+    df = df.rename(columns={"number": "codigo_estacion"})
+    df["codigo_estacion"] = df["codigo_estacion"].astype(int)
+
+    keep = df[["codigo_estacion", "lat", "lon"]].drop_duplicates("codigo_estacion")
+    SHARED.record("bike_geo", [raw], write_table(keep, name))
+    return keep
+
+
+def load_air_files(txts:list[Path], workers:int|None=None)->pd.DataFrame:
+    """Parsea los .txt (en paralelo si workers≠1) y los une en orden fijo:
+    ficheros ordenados por nombre, filas ordenadas por datetime y estación."""
+    workers=min(workers or os.cpu_count() or 1,len(txts)) or 1
+    if workers==1:
+        parts=[load_txt(f) for f in txts]
+    else:
+        with ProcessPoolExecutor(max_workers=workers,mp_context=dag.mp_context()) as pool:
+            parts=list(pool.map(load_txt,txts))          # map conserva el orden
+    full=pd.concat(parts,ignore_index=True)
+    full["station_id"]=full["station_id"].astype(int)   # tipado una sola vez
+    return full.sort_values(["datetime","station_id"],kind="stable",ignore_index=True)
+
+@stage("air_data")
+def air_data(workers:int|None=None)->tuple[pd.DataFrame,pd.DataFrame]:
+    txts=sorted(AIR_DIR.glob(f"*_{YEAR}.txt"))
+    if not txts:
+        raise FileNotFoundError(f"{AIR_DIR}/: no hay ficheros *_{YEAR}.txt")
+    names=["air_city_agg","air_station_hour"]
+    outs=[f for n in names for f in storage.paths(n,YEAR)]
+    if MANIFEST.fresh("air_data",txts,outs):
+        return tuple(read_table(n,year=YEAR) for n in names)
+    full=load_air_files(txts,workers)
+    outs=write_table(full,names[1],YEAR)
+
+    dt=full["datetime"].dt                          # claves aparte: full queda igual que la tabla
+    keys=[dt.month.rename("month"),dt.dayofweek.rename("dow"),dt.hour.rename("hour")]
+    city=(full.groupby(keys,as_index=False)
+            .agg(NO2=("NO2","mean"),PM10=("PM10","mean"),PM2_5=("PM2.5","mean"),
+                 NOx=("NOx","mean"),O3=("O3","mean"),
+                 Veloc=("Veloc.","mean"),Temp=("Temp.","mean")))
+    outs=write_table(city,names[0],YEAR)+outs
+    MANIFEST.record("air_data",txts,outs)
+    return city,full
+
+@stage("city_merge")
+def city_merge(bike_c:pd.DataFrame, air_c:pd.DataFrame)->pd.DataFrame:
+    ins=storage.paths("bike_city_agg",YEAR)+storage.paths("air_city_agg",YEAR)
+    name="city_bike_air"
+    if MANIFEST.fresh("city_merge",ins,storage.paths(name,YEAR)): return read_table(name,year=YEAR)
+    city=bike_c.merge(air_c,on=["month","dow","hour"])
+    MANIFEST.record("city_merge",ins,write_table(city,name,YEAR))
+    return city
+
+@stage("validate")
+def validate(bike_c:pd.DataFrame, bike_s:pd.DataFrame, air_c:pd.DataFrame,
+             air_f:pd.DataFrame, strict:bool=True)->None:
+    """Calidad de datos del año (validation.py): para el build si hay errores
+    y strict, antes de la serie horaria, el cross-walk y el cubo."""
+    txts=sorted(AIR_DIR.glob(f"*_{YEAR}.txt"))
+    ins=txts+[raw_path("bike_hour"),raw_path("bike_dev"),AIR_COORD]+storage.paths("bike_station_coords")
+    out=validation.report_path(YEAR)
+    if MANIFEST.fresh("validate",ins,[out]): return
+    issues=(validation.check_units(txts)+validation.check_air(air_f,YEAR)
+            +validation.check_bike("bike_city_agg",bike_c)
+            +validation.check_bike("bike_station_hour",bike_s)
+            +validation.check_keys(bike_c,air_c,bike_s,air_f,
+                                   read_table("bike_station_coords"),pd.read_csv(AIR_COORD)))
+    report=validation.report(issues,YEAR,fail=strict)
+    if not any(i.severity=="error" for i in issues):   # con errores (--warn-only) no queda
+        MANIFEST.record("validate",ins,[report])       # en caché: el próximo strict los ve
+
+# ───────── cross-walk bici ↔ aire ─────────
+IDW_K, IDW_POWER = 3, 2                  # vecinos por contaminante, exponente IDW
+
+def idw(dist: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Interpolación IDW en bloque.
+
+    dist   (n_bici, k)        distancias a los k vecinos
+    values (n_bici, k, 24)    perfil horario de cada vecino (NaN = sin dato)
+    Las horas sin dato en un vecino no cuentan en el peso de esa hora.
+    """
+    w = 1.0 / np.maximum(dist, 1.0) ** IDW_POWER                  # ≥1 m: sin /0
+    w = np.where(np.isnan(values), 0.0, w[:, :, None])
+    num = np.einsum("bkh,bkh->bh", w, np.nan_to_num(values))
+    den = w.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(den > 0, num / den, np.nan)
+
+@stage("station_index")
+def station_index() -> StationIndex:
+    """Índice espacial bici + aire, persistido en data/station_index.pkl."""
+    st_b = bike_geo()
+    ins = storage.paths("bike_station_coords") + [AIR_COORD]
+    if SHARED.fresh("station_index", ins, [index_path()]):
+        return load_index()
+    idx = StationIndex.from_frames(st_b, pd.read_csv(AIR_COORD))
+    SHARED.record("station_index", ins, [idx.save()])
+    return idx
+
+@stage("crosswalk")
+def crosswalk(bike_hour: pd.DataFrame, air_full: pd.DataFrame, idx: StationIndex):
+    """Enlaza cada estación bici con las estaciones de aire que miden cada
+    contaminante: k vecinos por contaminante en metros + IDW, en una pasada."""
+    ins = [index_path()] + [f for n in ("bike_station_hour", "air_station_hour")
+                            for f in storage.paths(n, YEAR)]
+    names = ["stations_crosswalk", "bike_air_spatial_hour"]
+    outs = [f for n in names for f in storage.paths(n, YEAR)]
+    if MANIFEST.fresh("crosswalk", ins, outs):
+        return read_table(names[1], year=YEAR)
+
+    # perfil horario medio estación × hora × contaminante
+    cols = list(POLLUTANTS.values())
+    prof = (air_full[["station_id", "datetime"] + [c for c in cols if c in air_full]]
+            .assign(hour=air_full["datetime"].dt.hour)
+            .groupby(["station_id", "hour"])[[c for c in cols if c in air_full]].mean()
+            .reindex(columns=cols)
+            .unstack("hour").reindex(columns=range(24), level=1))
+
+    st_b = (idx.stations[idx.stations["kind"] == "bike"]
+            .rename(columns={"station_id": "codigo_estacion"})
+            [["codigo_estacion", "lat", "lon"]].reset_index(drop=True))
+    lat_b, lon_b = st_b["lat"].to_numpy(), st_b["lon"].to_numpy()
+
+    # estación de aire más cercana que mida algún contaminante
+    aq_ids = prof.index[prof.notna().any(axis=1)]     # fuera las sólo-meteo
+    dist, near = idx.subset("air", aq_ids).query_knn(lat_b, lon_b, k=1)
+    st_b["nearest_aq_station"] = near[:, 0]
+    st_b["dist_km"] = dist[:, 0] / 1000
+    outs = write_table(st_b, names[0], YEAR)
+
+    # IDW por contaminante, sólo con las estaciones que lo miden
+    ids_b = st_b["codigo_estacion"].to_numpy()
+    interp = {}
+    for out_col, col in POLLUTANTS.items():
+        has = prof.index[prof[col].notna().any(axis=1)]
+        d, ids = idx.subset("air", has).query_knn(lat_b, lon_b, k=IDW_K)
+        vals = prof[col].reindex(ids.ravel()).to_numpy().reshape(*ids.shape, 24)
+        interp[out_col] = idw(d, vals).ravel()                  # (n_bici·24,)
+    air_bike = pd.DataFrame({"codigo_estacion": np.repeat(ids_b, 24),
+                             "hour": np.tile(np.arange(24), len(ids_b)), **interp})
+
+    bike_hour["codigo_estacion"] = bike_hour["codigo_estacion"].astype(int)
+    df = (bike_hour
+          .merge(st_b[["codigo_estacion", "nearest_aq_station", "dist_km"]],
+                 on="codigo_estacion")
+          .merge(air_bike, on=["codigo_estacion", "hour"], how="left"))
+    empty = df[list(POLLUTANTS)].isna().all(axis=1).sum()
+    if empty:
+        print(f"  ⚠ {empty} filas estación-hora sin ningún contaminante interpolado")
+    outs += write_table(df, names[1], YEAR)
+    MANIFEST.record("crosswalk", ins, outs)
+    return df
+
+
+@stage("hourly")
+def hourly_store(bike_c: pd.DataFrame, air_full: pd.DataFrame) -> None:
+    """Serie horaria completa (aire por estación + bici ciudad estimada)."""
+    ins = storage.paths("air_station_hour", YEAR) + storage.paths("bike_city_agg", YEAR)
+    if MANIFEST.fresh("hourly", ins):
+        return
+    outs = timeseries.write_air_hourly(air_full, YEAR)
+    outs += write_table(timeseries.bike_city_hourly(bike_c, YEAR), timeseries.BIKE_HOURLY, YEAR)
+    MANIFEST.record("hourly", ins, outs)
+
+
+@stage("cube")
+def aggregate_cube(city: pd.DataFrame, spatial: pd.DataFrame) -> None:
+    """Materializa el cubo de agregados que consume app.py."""
+    ins = [f for n in ("city_bike_air", "bike_air_spatial_hour", "stations_crosswalk")
+           for f in storage.paths(n, YEAR)]
+    if MANIFEST.fresh("cube", ins, cube.paths(YEAR)):
+        return
+    coords = read_table("stations_crosswalk", year=YEAR,
+                        columns=["codigo_estacion", "lat", "lon"])
+    tables, models = cube.build_cube(city, spatial, coords)
+    MANIFEST.record("cube", ins, cube.write_cube(tables, models, YEAR))
+
+
+@stage("lags")
+def lags(bike_c: pd.DataFrame, bike_hour: pd.DataFrame, air_full: pd.DataFrame,
+         idx: StationIndex) -> None:
+    """Correlación cruzada 0-48 h y ventanas móviles bici ↔ aire (lagged.py)."""
+    ins = [index_path()] + [f for n in ("bike_city_agg", "bike_station_hour", "air_station_hour")
+                            for f in storage.paths(n, YEAR)]
+    outs = [f for n in lagged.TABLES for f in storage.paths(n, YEAR)]
+    if MANIFEST.fresh("lags", ins, outs):
+        return
+    tables = lagged.build(bike_c, bike_hour, air_full, idx, YEAR)
+    MANIFEST.record("lags", ins, [f for n, df in tables.items() for f in write_table(df, n, YEAR)])
+
+
+# huella del código de cada etapa (build_manifest.py): si cambia la etapa o
+# un módulo del que depende su salida, se recalcula aunque no cambien los datos
+VERSIONS.update({
+    "bike_city": code_version(bike_city, valenbisi_raw),
+    "bike_station_hour": code_version(bike_station_hour, valenbisi_raw),
+    "bike_geo": code_version(bike_geo),
+    "air_data": code_version(air_data, load_air_files, air_parser),
+    "city_merge": code_version(city_merge),
+    "validate": code_version(validate, validation),
+    "station_index": code_version(station_index, StationIndex),
+    "crosswalk": code_version(crosswalk, idw, StationIndex),
+    "hourly": code_version(hourly_store, timeseries),
+    "cube": code_version(aggregate_cube, cube, analytics, downsample),
+    "lags": code_version(lags, lagged, analytics),
+})
+
+# ───────── pipeline ─────────
+TABLES = ["bike_city_agg", "air_city_agg", "city_bike_air", "bike_station_hour",
+          "air_station_hour", "stations_crosswalk", "bike_air_spatial_hour"]
+
+def year_graph(workers:int|None=None, strict:bool=True)->list[dag.Stage]:
+    """Etapas anuales como grafo: bici y aire se leen a la vez (aire parsea
+    en su propio pool de procesos), la validación corta antes de las lentas
+    y serie horaria, merge, cross-walk y lags corren en paralelo. `load` da el
+    resultado ya escrito en disco cuando --only / --from no la seleccionan.
+    El índice espacial lo construye main() una vez para todos los años: aquí
+    sólo se carga (load_index lo construye si falta) y se pasa a las etapas."""
+    air=["air_city_agg","air_station_hour"]
+    return [
+        dag.Stage("bike_city",bike_city,load=lambda: read_table("bike_city_agg",year=YEAR)),
+        dag.Stage("bike_station_hour",bike_station_hour,
+                  load=lambda: read_table("bike_station_hour",year=YEAR)),
+        dag.Stage("air_data",partial(air_data,workers),
+                  load=lambda: tuple(read_table(n,year=YEAR) for n in air)),
+        dag.Stage("index",load_index,load=load_index),
+        dag.Stage("validate",lambda bc,bs,a: validate(bc,bs,*a,strict),
+                  deps=("bike_city","bike_station_hour","air_data")),
+        dag.Stage("city_merge",lambda bc,a,_: city_merge(bc,a[0]),
+                  deps=("bike_city","air_data","validate"),
+                  load=lambda: read_table("city_bike_air",year=YEAR)),
+        dag.Stage("hourly",lambda bc,a,_: hourly_store(bc,a[1]),
+                  deps=("bike_city","air_data","validate")),
+        dag.Stage("crosswalk",lambda bs,a,idx,_: crosswalk(bs,a[1],idx),
+                  deps=("bike_station_hour","air_data","index","validate"),
+                  load=lambda: read_table("bike_air_spatial_hour",year=YEAR)),
+        dag.Stage("lags",lambda bc,bs,a,idx,_: lags(bc,bs,a[1],idx),
+                  deps=("bike_city","bike_station_hour","air_data","index","validate")),
+        dag.Stage("cube",aggregate_cube,deps=("city_merge","crosswalk")),
+    ]
+
+def build_year(year:int, force:bool=False, workers:int|None=None,
+               csv:bool=False, offline:bool|None=None, strict:bool=True,
+               only:list[str]|None=None, start:str|None=None)->dict:
+    """Etapas anuales de `year` (todas, o las de --only / --from); devuelve
+    {tabla: (filas, cols)} tomadas de los frames en memoria (sin releer las
+    tablas) o, si la etapa no se ejecutó, de los metadatos del Parquet."""
+    set_year(year,force); storage.EXPORT_CSV=csv
+    if offline is not None: fetcher.OFFLINE=offline
+
+    res=dag.run(year_graph(workers,strict),only=only,start=start,prefix=f"[{year}] ")
+    bike_c,bike_s,city,spatial=(res.get(n) for n in ("bike_city","bike_station_hour",
+                                                     "city_merge","crosswalk"))
+    air_c,air_f=res.get("air_data") or (None,None)
+    frames=dict(zip(TABLES,[bike_c,air_c,city,bike_s,air_f,None,spatial]))
+    return {n:(df.shape if df is not None else storage.table_shape(n,year))  # sólo metadatos
+            for n,df in frames.items() if df is not None or storage.parquet_path(n,year).exists()}
+
+def _build_after(build, year:int, *_deps)->dict:
+    """build_year en un proceso del DAG (descarta los resultados de sus dependencias)."""
+    return build(year,offline=True)
+
+def main(argv:list[str]|None=None)->None:
+    ap=argparse.ArgumentParser(description=__doc__.split("\n")[3])
+    ap.add_argument("--year",type=int,nargs="+",default=[YEAR],
+                    help="años a construir (cada uno en su partición year=<año>)")
+    ap.add_argument("--jobs",type=int,default=None,
+                    help="años en paralelo (por defecto, uno por año hasta nº de CPUs)")
+    ap.add_argument("--force",action="store_true",
+                    help="ignora el manifiesto y recalcula todas las etapas")
+    ap.add_argument("--workers",type=int,default=None,
+                    help="procesos para parsear air_txt/ (1 = en serie; por defecto, CPUs / jobs)")
+    ap.add_argument("--only",nargs="+",default=None,metavar="ETAPA",
+                    help="ejecuta sólo estas etapas anuales; sus dependencias se leen de disco")
+    ap.add_argument("--from",dest="start",default=None,metavar="ETAPA",
+                    help="ejecuta esta etapa anual y todas las que dependen de ella")
+    ap.add_argument("--csv",action="store_true",
+                    help="exporta además cada tabla a .csv")
+    ap.add_argument("--offline",action="store_true",default=fetcher.OFFLINE,
+                    help="sin red: construye sólo con el espejo data/raw/")
+    ap.add_argument("--base-url",default=fetcher.BASE_URL,
+                    help="raíz de la API Opendatasoft (p.ej. un servidor local)")
+    ap.add_argument("--warn-only",action="store_true",
+                    help="informa de los errores de validación sin parar el build")
+    ap.add_argument("--log",type=Path,default=runlog.LOG,
+                    help="log JSON-lines con tiempos, memoria y filas por etapa")
+    ap.add_argument("--profile",choices=runlog.PROFILERS,default=None,
+                    help="perfila las etapas (salida en data/profiles/)")
+    ap.add_argument("--profile-stage",nargs="+",default=None,metavar="ETAPA",
+                    help="perfila sólo estas etapas (p.ej. air_data crosswalk)")
+    args=ap.parse_args(argv); years=sorted(set(args.year))
+    if args.only and args.start:
+        ap.error("--only y --from son excluyentes")
+    try:
+        dag.select(year_graph(),args.only,args.start)
+    except ValueError as e:
+        ap.error(str(e))
+    SHARED.force=args.force; storage.EXPORT_CSV=args.csv
+    fetcher.OFFLINE=args.offline; fetcher.BASE_URL=args.base_url
+    run_id=runlog.configure(profile=args.profile,profile_stages=args.profile_stage,log=args.log)
+
+    # grafo global: descargas en hilos, índice común y un proceso por año; cada
+    # año arranca en cuanto están sus exports y el índice, sin esperar al resto
+    n_jobs=min(args.jobs or os.cpu_count() or 1,len(years))
+    workers=args.workers or max(1,(os.cpu_count() or 1)//n_jobs)
+    build=partial(build_year,force=args.force,workers=workers,csv=args.csv,
+                  strict=not args.warn_only,only=args.only,start=args.start)
+
+    def index()->None:
+        station_index(); SHARED.force=False          # los años sólo lo leen
+
+    stages=[dag.Stage(f"fetch:{k}:{y}",partial(fetch,dataset_id(k,y),raw_path(k,y)))
+            for y in years for k in YEARLY]
+    stages+=[dag.Stage("fetch:bike_geo",partial(fetch,dataset_id("bike_geo"),raw_path("bike_geo"))),
+             dag.Stage("station_index",lambda _: index(),deps=("fetch:bike_geo",))]
+    for i,y in enumerate(years):
+        deps=(*(f"fetch:{k}:{y}" for k in YEARLY),"station_index")
+        if n_jobs==1:                                # en este proceso, un año tras otro
+            stages.append(dag.Stage(f"year:{y}",lambda *_,y=y: build(y),
+                                    deps=deps+((f"year:{years[i-1]}",) if i else ())))
+        else:                                        # espejo ya sincronizado: sin red
+            stages.append(dag.Stage(f"year:{y}",partial(_build_after,build,y),deps=deps,
+                                    kind="process"))
+    res=dag.run(stages,processes=n_jobs)
+    summaries=[res[f"year:{y}"] for y in years]
+
+    # ── Validación rápida ───────────────────────
+    for year,summary in zip(years,summaries):
+        print(f"\n📊  Resumen de tablas generadas ({year}):")
+        for k,v in summary.items(): print(f"  {k:22s} → {v[0]:7,d} filas × {v[1]} cols")
+
+    print(f"\n⏱  Etapas (run {run_id}, detalle en {runlog.LOG}):")
+    print(runlog.summary(run_id))
+
+    print("\n✅ Pipeline finalizado sin peticiones externas en cross-walk.")
+
+if __name__=="__main__":
+    main()
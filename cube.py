@@ -0,0 +1,185 @@
+"""
+cube.py
+-------
+Cubo de agregados precalculados para el dashboard.
+
+El pipeline materializa en data/cube/ (una partición year=<año> por tabla)
+todo lo que app.py mostraba calculándolo en cada rerun:
+
+  city            filas ciudad (mes × dow × hora) + is_weekend
+  city_<dim>      medias ciudad por hour / dow / month / is_weekend
+  heat_<var>      heatmap hora × dow de NO2 y bike_trips
+  kpis            mean / std / min / max por variable
+  corr, spearman  matrices de correlación (Pearson y Spearman)
+  station         media por estación bici (NO2, prestamos_mean) + lat/lon
+  ols_month       NO2 ~ bike_trips + Veloc + Temp ajustada por mes
+  ols_station     NO2 ~ prestamos_mean por estación (perfil de 24 horas)
+  box_<dim>       cuartiles/bigotes de NO2 y bike_trips por mes y por
+                  mes × is_weekend (month=0: todos los meses), con sus
+                  outliers más extremos en box_<dim>_out (downsample.py)
+  models.json     regresiones globales NO2 ~ bike_trips + Veloc + Temp y
+                  NO2 ~ bike_trips (recta del scatter del dashboard)
+
+`load_cube` devuelve un Cube (dict perezoso): cada vista y sus tablas se
+leen la primera vez que se piden, así cada sección del dashboard sólo carga
+lo que muestra.
+
+Toda la estadística sale de analytics.py (un ajuste por grupo en una sola
+llamada vectorizada).
+
+El detalle espacial sólo tiene la dimensión hora, así que los agregados por
+estación son por hora y globales. El perfil horario de una estación no se
+materializa: el dashboard lo consulta en bike_air_spatial_hour (query.py).
+"""
+from __future__ import annotations
+import json
+import pandas as pd
+import analytics
+import downsample
+import storage
+from storage import read_table, write_table
+
+CUBE = "cube"                                        # data/cube/*.parquet
+MODELS = "models.json"
+METRICS = ["NO2", "PM10", "PM2_5", "NOx", "O3", "Veloc", "Temp", "bike_trips"]
+DIMS = ["hour", "dow", "month", "is_weekend"]
+HEAT_VARS = ["NO2", "bike_trips"]
+BOX_VARS = ["NO2", "bike_trips"]
+BOXES = {"month": ["month"], "weekend": ["month", "is_weekend"]}
+REG_X, REG_Y = ["bike_trips", "Veloc", "Temp"], "NO2"
+TABLES = (["city", "kpis", "corr", "spearman", "station", "ols_month", "ols_station"]
+          + [f"city_{d}" for d in DIMS] + [f"heat_{v}" for v in HEAT_VARS]
+          + [f"box_{b}{s}" for b in BOXES for s in ("", "_out")])
+
+
+def models_path(year: int):
+    return storage.DATA_DIR / CUBE / "models" / f"year={year}" / MODELS
+
+
+def paths(year: int) -> list:
+    """Ficheros que escribe `write_cube`."""
+    return ([f for t in TABLES for f in storage.paths(f"{CUBE}/{t}", year)]
+            + [models_path(year)])
+
+
+def build_cube(city: pd.DataFrame, spatial: pd.DataFrame,
+               coords: pd.DataFrame) -> tuple[dict[str, pd.DataFrame], dict]:
+    city = city.assign(is_weekend=(city["dow"] >= 5).astype("int16"))
+    cols = [c for c in METRICS if c in city.columns]
+    t = {"city": city}
+    for d in DIMS:
+        t[f"city_{d}"] = city.groupby(d, as_index=False)[cols].mean()
+    for v in HEAT_VARS:
+        heat = city.pivot_table(index="hour", columns="dow", values=v, aggfunc="mean")
+        heat.columns = heat.columns.astype(str)
+        t[f"heat_{v}"] = heat.reset_index()
+    t["kpis"] = analytics.kpis(city, cols).reset_index()
+    t["corr"] = analytics.pearson(city, cols).reset_index()
+    t["spearman"] = analytics.spearman(city, cols).reset_index()
+    for b, by in BOXES.items():
+        src = city if by == ["month"] else pd.concat([city, city.assign(month=0)])
+        t[f"box_{b}"], t[f"box_{b}_out"] = downsample.box_stats(src, by, BOX_VARS)
+
+    sh = spatial[["codigo_estacion", "hour", "NO2", "prestamos_mean"]]
+    st_mean = sh.groupby("codigo_estacion", as_index=False)[["NO2", "prestamos_mean"]].mean()
+    t["station"] = coords[["codigo_estacion", "lat", "lon"]].merge(
+        st_mean, on="codigo_estacion", how="left")
+
+    X, y = city[REG_X].to_numpy("float64"), city[REG_Y].to_numpy("float64")
+    t["ols_month"] = analytics.ols_groups(X, y, city["month"], REG_X).reset_index()
+    t["ols_station"] = analytics.ols_groups(
+        sh[["prestamos_mean"]].to_numpy("float64"), sh["NO2"].to_numpy("float64"),
+        sh["codigo_estacion"], ["prestamos_mean"]).reset_index()
+    models = {"NO2_lineal": {"y": REG_Y, "x": REG_X, **analytics.ols(X, y)},
+              "NO2_bike": {"y": REG_Y, "x": ["bike_trips"],
+                           **analytics.ols(X[:, :1], y)}}
+    return t, models
+
+
+def write_cube(tables: dict[str, pd.DataFrame], models: dict, year: int) -> list:
+    out = []
+    for name, df in tables.items():
+        out += write_table(df, f"{CUBE}/{name}", year)
+    models_path(year).parent.mkdir(parents=True, exist_ok=True)
+    models_path(year).write_text(json.dumps(models, indent=1), encoding="utf-8")
+    return out + [models_path(year)]
+
+
+def cube_from_tables(year: int) -> tuple[dict[str, pd.DataFrame], dict]:
+    """Construye el cubo de `year` desde las tablas del pipeline (o sus CSV)."""
+    city = read_table("city_bike_air", year=year)
+    spatial = read_table("bike_air_spatial_hour", year=year,
+                         columns=["codigo_estacion", "hour", "NO2", "prestamos_mean"])
+    coords = read_table("stations_crosswalk", year=year,
+                        columns=["codigo_estacion", "lat", "lon"])
+    return build_cube(city, spatial, coords)
+
+
+def _index(table: str, col: str):
+    return lambda c: c.table(table).set_index(col)
+
+
+def _heat(v: str):
+    def view(c):
+        heat = c.table(f"heat_{v}").set_index("hour")
+        heat.columns = heat.columns.astype(int)
+        return heat
+    return view
+
+
+# vista del dashboard → cómo se obtiene de las tablas del cubo
+VIEWS = {
+    "models": lambda c: c.models(),
+    "city": lambda c: c.table("city"),
+    **{f"city_{d}": _index(f"city_{d}", d) for d in DIMS},
+    **{f"heat_{v}": _heat(v) for v in HEAT_VARS},
+    "kpis": _index("kpis", "variable"),
+    "corr": _index("corr", "variable"),
+    "spearman": _index("spearman", "variable"),
+    "ols_month": _index("ols_month", "month"),
+    "ols_station": _index("ols_station", "codigo_estacion"),
+    **{f"box_{b}{s}": (lambda name: lambda c: c.table(name))(f"box_{b}{s}")
+       for b in BOXES for s in ("", "_out")},
+    "station": lambda c: c.table("station"),
+    "top5_NO2": lambda c: c.table("station").nlargest(5, "NO2"),
+    "top5_bike": lambda c: c.table("station").nlargest(5, "prestamos_mean"),
+    "station_ids": lambda c: sorted(c.table("station")["codigo_estacion"].unique()),
+}
+
+
+class Cube(dict):
+    """Vistas del cubo de un año; cada una (y sus tablas) se lee al primer acceso."""
+
+    def __init__(self, year: int, tables: dict | None = None, models: dict | None = None):
+        super().__init__()
+        self.year = year
+        self._tables = dict(tables or {})
+        self._models = models
+
+    def table(self, name: str) -> pd.DataFrame:
+        if name not in self._tables:
+            self._tables[name] = read_table(f"{CUBE}/{name}", year=self.year)
+        return self._tables[name]
+
+    def models(self) -> dict:
+        if self._models is None:
+            self._models = json.loads(models_path(self.year).read_text(encoding="utf-8"))
+        return self._models
+
+    def __missing__(self, key: str):
+        if key not in VIEWS:
+            raise KeyError(key)
+        self[key] = view = VIEWS[key](self)
+        return view
+
+
+def load_cube(year: int) -> Cube:
+    """Cubo de `year` con las vistas que usa el dashboard, cargadas bajo demanda.
+
+    Si data/cube/ no existe todavía se calcula en memoria a partir de las
+    tablas del pipeline (una sola vez por proceso si se memoiza).
+    """
+    if all(storage.parquet_path(f"{CUBE}/{t}", year).exists() for t in TABLES) \
+            and models_path(year).exists():
+        return Cube(year)
+    return Cube(year, *cube_from_tables(year))
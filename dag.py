@@ -0,0 +1,156 @@
+"""
+dag.py
+------
+Planificador de etapas declaradas como grafo de dependencias (DAG).
+
+Cada Stage declara su función, las etapas de las que depende (recibe sus
+resultados como argumentos, en ese orden) y dónde se ejecuta:
+
+  thread    E/S y pandas que suelta el GIL: descargas, lecturas, merges
+  process   trabajo de CPU en otro proceso (argumentos y resultado se
+            serializan; la función debe poder importarse por nombre)
+
+`run()` lanza cada etapa en cuanto terminan sus dependencias, así que el
+tiempo total es el del camino crítico y no la suma de las etapas. Si una
+falla no se lanza ninguna más y se propaga el error en cuanto acaban las
+que ya estaban en marcha.
+
+Los procesos se crean con forkserver donde existe (`mp_context()`): hacer
+fork de un proceso con hilos de etapas en marcha puede dejar al hijo
+bloqueado en un lock que tenía otro hilo en el momento del fork.
+
+Selección (--only / --from en el pipeline):
+  only    sólo esas etapas
+  start   esa etapa y todas las que dependen de ella
+Las dependencias que quedan fuera de la selección no se ejecutan: se
+toma su resultado de disco con `load` (una etapa sin `load` devuelve None).
+"""
+from __future__ import annotations
+import multiprocessing
+from collections.abc import Callable, Iterable
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, NamedTuple
+
+KINDS = ("thread", "process")
+
+
+class Stage(NamedTuple):
+    name: str
+    fn: Callable
+    deps: tuple[str, ...] = ()
+    kind: str = "thread"
+    load: Callable[[], Any] | None = None     # resultado ya en disco (etapa no seleccionada)
+
+
+def mp_context():
+    """Contexto de multiprocessing seguro con hilos (forkserver, o el de la plataforma)."""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else None)
+
+
+def _index(stages: Iterable[Stage]) -> dict[str, Stage]:
+    by_name: dict[str, Stage] = {}
+    for s in stages:
+        if s.name in by_name:
+            raise ValueError(f"etapa duplicada: {s.name}")
+        if s.kind not in KINDS:
+            raise ValueError(f"{s.name}: kind {s.kind!r} (usa {', '.join(KINDS)})")
+        by_name[s.name] = s
+    for s in by_name.values():
+        for d in s.deps:
+            if d not in by_name:
+                raise ValueError(f"{s.name}: depende de {d!r}, que no existe")
+    return by_name
+
+
+def order(stages: Iterable[Stage]) -> list[str]:
+    """Orden topológico (estable respecto a la declaración); error si hay ciclos."""
+    by_name = _index(stages)
+    done: list[str] = []
+    state: dict[str, int] = {}                     # 1 = visitando, 2 = hecho
+    def visit(n: str, path: tuple) -> None:
+        if state.get(n) == 2:
+            return
+        if state.get(n) == 1:
+            raise ValueError("ciclo: " + " → ".join(path + (n,)))
+        state[n] = 1
+        for d in by_name[n].deps:
+            visit(d, path + (n,))
+        state[n] = 2
+        done.append(n)
+    for n in by_name:
+        visit(n, ())
+    return done
+
+
+def select(stages: Iterable[Stage], only: Iterable[str] | None = None,
+           start: str | None = None) -> set[str]:
+    """Nombres de las etapas que se ejecutan con --only / --from."""
+    by_name = _index(stages)
+    unknown = [n for n in list(only or ()) + ([start] if start else []) if n not in by_name]
+    if unknown:
+        raise ValueError(f"etapas desconocidas: {', '.join(unknown)} "
+                         f"(hay {', '.join(by_name)})")
+    if only:
+        return set(only)
+    if start:
+        chosen = {start}
+        for n in order(by_name.values()):          # descendientes, en orden topológico
+            if any(d in chosen for d in by_name[n].deps):
+                chosen.add(n)
+        return chosen
+    return set(by_name)
+
+
+def run(stages: Iterable[Stage], only: Iterable[str] | None = None,
+        start: str | None = None, threads: int | None = None,
+        processes: int | None = None, log: Callable[[str], None] | None = print,
+        prefix: str = "") -> dict[str, Any]:
+    """Ejecuta el grafo y devuelve {etapa: resultado}."""
+    stages = list(stages)
+    by_name = _index(stages)
+    chosen = select(stages, only, start)
+    needed = set()
+    for n in reversed(order(stages)):              # las elegidas y lo que necesitan
+        if n in chosen or any(n in by_name[m].deps for m in needed):
+            needed.add(n)
+
+    results: dict[str, Any] = {}
+    running: dict[Future, str] = {}
+    pending = [n for n in order(stages) if n in needed]
+    pools: dict[str, Any] = {}
+
+    def pool(kind: str):
+        if kind not in pools:
+            pools[kind] = (ThreadPoolExecutor(max_workers=threads or len(stages) or 1,
+                                              thread_name_prefix="stage")
+                           if kind == "thread" else ProcessPoolExecutor(max_workers=processes,
+                                                     mp_context=mp_context()))
+        return pools[kind]
+
+    try:
+        while pending or running:
+            for n in [n for n in pending if all(d in results for d in by_name[n].deps)]:
+                s = by_name[n]
+                pending.remove(n)
+                if n in chosen:
+                    if log: log(f"▶ {prefix}{n}")
+                    fut = pool(s.kind).submit(s.fn, *(results[d] for d in s.deps))
+                else:
+                    if log: log(f"· {prefix}{n} (de disco)")
+                    fut = pool("thread").submit(s.load or (lambda: None))
+                running[fut] = n
+            if not running:
+                raise RuntimeError(f"etapas bloqueadas: {', '.join(pending)}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                n = running.pop(fut)
+                if fut.exception() is not None:
+                    pending.clear()                # fail fast: no se lanza nada más
+                    wait(running)
+                    raise fut.exception()
+                results[n] = fut.result()
+    finally:
+        for p in pools.values():
+            p.shutdown(cancel_futures=True)
+    return results
@@ -0,0 +1,131 @@
+"""
+dashboard_data.py
+-----------------
+Acceso a datos del dashboard con caché compartida entre sesiones.
+
+Las cargas se memoizan con `st.cache_resource` (un único objeto por proceso,
+sin copias por sesión). La clave incluye (ruta, mtime, tamaño) de cada
+fichero de origen, así que cuando el pipeline reescribe las tablas la caché
+se invalida sola en el siguiente rerun.
+
+Los frames se devuelven ya tipados (storage.py). Los filtros del dashboard
+(mes, laborable/finde, horas, estación) son consultas parametrizadas sobre
+los Parquet (query.py, DuckDB): sólo se leen las filas y columnas pedidas,
+con su propia caché de resultados.
+
+Todo va por año: sólo se leen las particiones year=<año> del año elegido.
+
+Para el arranque en frío: el cubo es perezoso (cada sección lee sólo sus
+tablas al usarlas), el índice espacial (scipy) se importa la primera vez
+que se pide y las imágenes se sirven ya redimensionadas (assets.py) y en
+memoria.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import TYPE_CHECKING
+import pandas as pd
+import streamlit as st
+import assets
+import cube as cube_mod
+import storage
+from storage import stamp
+
+if TYPE_CHECKING:                                    # scipy: sólo en la sección espacial
+    from station_index import StationIndex
+
+SOURCES = ["city_bike_air", "bike_air_spatial_hour", "stations_crosswalk"]
+LIVE_REFRESH = 15                                    # s entre relecturas del estado en directo
+
+
+def _source_files(names, year: int) -> list[Path]:
+    return [f for n in names
+            for f in (storage.parquet_path(n, year), storage.csv_path(n, year))]
+
+
+def years() -> list[int]:
+    """Años con tablas construidas (o CSV versionados)."""
+    return storage.list_years(SOURCES[0])
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _load_cube(year: int, key: tuple) -> dict:
+    # `key` sólo sirve de clave de caché (no empieza por "_" para que
+    # Streamlit la tenga en cuenta al hashear los argumentos)
+    return cube_mod.load_cube(year)
+
+
+def cube(year: int) -> cube_mod.Cube:
+    """Cubo de agregados de `year` (ver cube.py), recargado si cambian sus ficheros."""
+    return _load_cube(year, stamp(cube_mod.paths(year) + _source_files(SOURCES, year)))
+
+
+def city(year: int, month: int | None = None, weekend: bool | None = None,
+         hours: tuple[int, int] | None = None, columns: list[str] | None = None) -> pd.DataFrame:
+    """Filas ciudad mes × dow × hora con `is_weekend`, filtradas en SQL."""
+    import query                                      # duckdb: sólo si se consulta
+    return query.city(year, month, weekend, hours, columns)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _live_status(key: tuple) -> pd.DataFrame | None:
+    import availability
+    return availability.read_status()
+
+
+def live_status() -> pd.DataFrame | None:
+    """Estado actual por estación que escribe el poller (availability.py);
+    sólo se relee cuando el fichero cambia."""
+    import availability                               # requests: sólo en esa sección
+    return _live_status(stamp([availability.status_path()]))
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _load_lags(year: int, key: tuple) -> dict[str, pd.DataFrame]:
+    return {n: storage.read_table(n, year=year) for n in ("lag_air", "lag_bike")}
+
+
+def lags(year: int) -> dict[str, pd.DataFrame] | None:
+    """Correlaciones cruzadas 0-48 h de `year` (lagged.py; None si no se han construido)."""
+    files = [storage.parquet_path(n, year) for n in ("lag_air", "lag_bike")]
+    if not all(f.exists() for f in files):
+        return None
+    return _load_lags(year, stamp(files))
+
+
+def rolling_air(year: int, station: int) -> pd.DataFrame:
+    """NO2 de una estación de aire en ventana móvil (sólo sus filas, vía SQL)."""
+    import query
+    return query.rolling_air(year, station)
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def _bike_rolling(year: int, station: int, air_station: int, key: tuple) -> pd.DataFrame:
+    import lagged
+    return lagged.bike_rolling(year, station, air_station)
+
+
+def bike_rolling(year: int, station: int, air_station: int) -> pd.DataFrame:
+    """Ventana móvil de una estación bici frente al NO2 de `air_station`,
+    calculada al pedirla (O(n)) y guardada mientras no cambien las tablas."""
+    import timeseries
+    files = [storage.parquet_path(n, year) for n in (timeseries.BIKE_HOURLY, "bike_station_hour")]
+    files += sorted(timeseries.dataset_dir().glob(f"year={year}/station_id={air_station}/*.parquet"))
+    return _bike_rolling(year, int(station), int(air_station), stamp(files))
+
+
+def stations_index() -> StationIndex:
+    """Índice espacial bici + aire (load-once, ver station_index.py)."""
+    import station_index                              # scipy: sólo en la sección espacial
+    return station_index.load_index()
+
+
+@st.cache_resource(show_spinner=False)
+def image(name: str) -> bytes:
+    """PNG de static/ redimensionado a su tamaño de uso (assets.SIZES)."""
+    return assets.resized(name).read_bytes()
+
+
+def station_hour(codigo_estacion: int, year: int) -> pd.DataFrame:
+    """Filas horarias de una estación (filtro bajado al Parquet)."""
+    import query
+    return query.station_hour(year, codigo_estacion)
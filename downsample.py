@@ -0,0 +1,123 @@
+"""
+downsample.py
+-------------
+Reducción de puntos en el servidor para las gráficas plotly del dashboard.
+
+  lttb        Largest-Triangle-Three-Buckets: n puntos que conservan la forma
+  minmax      mínimo y máximo de cada cubo (no se pierde ningún pico)
+  series      aplica uno de los dos a varias columnas de una ventana de filas
+  box_stats   cuartiles, bigotes (1,5·IQR), media y n por grupo, más los
+              outliers más extremos (como mucho `max_outliers` por grupo)
+  box_figure  go.Box con esos cuartiles precalculados (sin mandar las filas)
+
+El presupuesto de puntos va por ancho de gráfico (POINTS ≈ 1 punto por
+píxel de un gráfico a todo el ancho) y se aplica sobre la ventana visible:
+al acotar el rango se ve más detalle sin mandar más datos al navegador.
+"""
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+
+POINTS = 1500                                        # puntos por serie
+MAX_OUTLIERS = 50                                    # outliers por caja
+WHISKER = 1.5
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Posiciones de los `n` puntos LTTB de (x, y) (sin NaN, x creciente)."""
+    x = np.asarray(x, "float64")
+    y = np.asarray(y, "float64")
+    N = len(y)
+    if n >= N or n < 3:
+        return np.arange(N)
+    # n-2 cubos entre el primer y el último punto; medias de cada cubo de una vez
+    edges = np.linspace(1, N - 1, n - 1).astype(int)
+    size = np.diff(edges)
+    avg_x = np.add.reduceat(x[:N - 1], edges[:-1]) / size
+    avg_y = np.add.reduceat(y[:N - 1], edges[:-1]) / size
+    out = np.empty(n, dtype=int)
+    out[0], out[-1] = 0, N - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        cx, cy = (avg_x[i + 1], avg_y[i + 1]) if i < n - 3 else (x[-1], y[-1])
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax(y: np.ndarray, n: int) -> np.ndarray:
+    """Posiciones del mínimo y el máximo de n/2 cubos consecutivos de `y` (sin NaN)."""
+    y = np.asarray(y, "float64")
+    N = len(y)
+    if n >= N:
+        return np.arange(N)
+    starts = np.linspace(0, N, max(n // 2, 1) + 1).astype(int)[:-1]
+    bucket = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, N)))
+    order = np.lexsort((y, bucket))                  # por cubo y, dentro, por valor
+    ends = np.append(starts[1:], N) - 1
+    return np.union1d(order[starts], order[ends])
+
+
+def series(df: pd.DataFrame, cols: list[str], n: int = POINTS, how: str = "lttb",
+           x: str | None = None, window: tuple[int, int] | None = None) -> pd.DataFrame:
+    """Filas de `df` (en la ventana de posiciones [lo, hi)) reducidas a unos `n`
+    puntos por columna; el índice se conserva, así que el eje x no cambia."""
+    if window is not None:
+        df = df.iloc[window[0]:window[1]]
+    if len(df) <= n:
+        return df
+    xs = np.arange(len(df), dtype="float64") if x is None else df[x].to_numpy("float64")
+    keep = []
+    for c in cols:
+        y = df[c].to_numpy("float64")
+        ok = np.flatnonzero(~np.isnan(y))
+        sel = lttb(xs[ok], y[ok], n) if how == "lttb" else minmax(y[ok], n)
+        keep.append(ok[sel])
+    return df.iloc[np.unique(np.concatenate(keep))]
+
+
+def box_stats(df: pd.DataFrame, by: list[str], cols: list[str],
+              max_outliers: int = MAX_OUTLIERS) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Cajas de `cols` por `by`, en formato largo (columna `variable`).
+
+    Devuelve (stats, outliers): stats con q1, median, q3, mean, n, lowerfence
+    y upperfence (dato más extremo dentro de 1,5·IQR, como plotly); outliers
+    con los `max_outliers` puntos más alejados de la mediana de cada caja.
+    """
+    keys = [*by, "variable"]
+    long = df.melt(id_vars=by, value_vars=cols, var_name="variable").dropna(subset=["value"])
+    g = long.groupby(keys, sort=True)["value"]
+    q = g.quantile([0.25, 0.5, 0.75]).unstack()
+    stats = pd.DataFrame({"q1": q[0.25], "median": q[0.5], "q3": q[0.75],
+                          "mean": g.mean(), "n": g.size()})
+    iqr = stats["q3"] - stats["q1"]
+    b = pd.DataFrame({"lo": stats["q1"] - WHISKER * iqr, "hi": stats["q3"] + WHISKER * iqr,
+                      "median": stats["median"]})
+    long = long.join(b, on=keys)
+    inside = long["value"].between(long["lo"], long["hi"])
+    fences = long[inside].groupby(keys)["value"].agg(["min", "max"])
+    stats["lowerfence"] = fences["min"]
+    stats["upperfence"] = fences["max"]
+    out = long[~inside].assign(dist=lambda d: (d["value"] - d["median"]).abs())
+    out = (out.sort_values("dist", ascending=False).groupby(keys).head(max_outliers)
+           .sort_values(keys)[[*keys, "value"]].reset_index(drop=True))
+    return stats.reset_index(), out
+
+
+def box_figure(stats: pd.DataFrame, outliers: pd.DataFrame, x: str, y: str,
+               labels: dict | None = None):
+    """Boxplot de la variable `y` por `x` a partir de `box_stats`."""
+    import plotly.graph_objects as go
+    labels = labels or {}
+    s = stats[stats["variable"] == y]
+    o = outliers[outliers["variable"] == y]
+    fig = go.Figure(go.Box(x=s[x], q1=s["q1"], median=s["median"], q3=s["q3"],
+                           lowerfence=s["lowerfence"], upperfence=s["upperfence"],
+                           mean=s["mean"], name=labels.get(y, y), boxpoints=False))
+    if len(o):
+        fig.add_scatter(x=o[x], y=o["value"], mode="markers", name="Outliers",
+                        marker=dict(size=4, opacity=0.6))
+    fig.update_layout(xaxis_title=labels.get(x, x), yaxis_title=labels.get(y, y))
+    return fig
@@ -1,171 +1,248 @@
+"""
+eda_valenbisi_air.py
+--------------------
+EDA: KPIs, regresiones y figuras en figures/.
+
+Cada figura se declara como (fichero, tipo, datos, parámetros) y se dibuja
+en un pool de procesos con el backend Agg; matplotlib/seaborn sólo se
+importan en los procesos que dibujan. Una figura se salta si su fichero
+existe y el hash de sus datos y parámetros coincide con el de la última vez
+(figures/.figcache.json), así que tras un cambio pequeño en los datos sólo
+se redibujan las figuras afectadas.
+
+Uso:
+    python eda_valenbisi_air.py [2022 2023 …] [--jobs N] [--force]
+"""
+import argparse
+import hashlib
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-# Crear carpeta para guardar figuras
-os.makedirs('figures', exist_ok=True)
-
-# Cargar datasets principales
-city = pd.read_csv('data/city_bike_air_2022.csv')
-spatial = pd.read_csv('data/bike_air_spatial_hour_2022.csv')
-
-# --- KPIs básicos ---
-# Media y desviación de contaminantes y viajes
-kpis = city[['NO2', 'PM10', 'PM2_5', 'O3', 'bike_trips']].agg(['mean', 'std', 'min', 'max'])
-kpis.to_csv('figures/kpis_city.csv')
-print('KPIs guardados en figures/kpis_city.csv')
-
-# --- Series temporales ---
-plt.figure(figsize=(12,5))
-plt.plot(city['NO2'], label='NO2')
-plt.plot(city['bike_trips'], label='Viajes Bici', alpha=0.7)
-plt.title('Evolución NO2 y Viajes en Bici (Ciudad)')
-plt.xlabel('Índice temporal')
-plt.ylabel('Valor')
-plt.legend()
-plt.tight_layout()
-plt.savefig('figures/serie_NO2_bici.png')
-plt.close()
-
-# --- Heatmap hora vs día de la semana (NO2) ---
-heatmap_data = city.pivot_table(index='hour', columns='dow', values='NO2', aggfunc='mean')
-plt.figure(figsize=(8,6))
-sns.heatmap(heatmap_data, cmap='coolwarm')
-plt.title('Heatmap NO2 por hora y día de la semana')
-plt.ylabel('Hora')
-plt.xlabel('Día de la semana (0=Lunes)')
-plt.tight_layout()
-plt.savefig('figures/heatmap_NO2.png')
-plt.close()
-
-# --- Heatmap hora vs día de la semana (Viajes Bici) ---
-heatmap_data_bike = city.pivot_table(index='hour', columns='dow', values='bike_trips', aggfunc='mean')
-plt.figure(figsize=(8,6))
-sns.heatmap(heatmap_data_bike, cmap='YlGnBu')
-plt.title('Heatmap Viajes Bici por hora y día de la semana')
-plt.ylabel('Hora')
-plt.xlabel('Día de la semana (0=Lunes)')
-plt.tight_layout()
-plt.savefig('figures/heatmap_bike.png')
-plt.close()
-
-# --- Scatterplot NO2 vs Viajes Bici ---
-plt.figure(figsize=(7,5))
-sns.scatterplot(data=city, x='bike_trips', y='NO2', alpha=0.6)
-plt.title('Relación NO2 vs Viajes en Bici (Ciudad)')
-plt.xlabel('Viajes en Bici')
-plt.ylabel('NO2')
-plt.tight_layout()
-plt.savefig('figures/scatter_NO2_bici.png')
-plt.close()
-
-# --- KPIs avanzados ---
-# Día y hora con mayor y menor contaminación y uso
-max_no2 = city.loc[city['NO2'].idxmax()]
-min_no2 = city.loc[city['NO2'].idxmin()]
-max_bike = city.loc[city['bike_trips'].idxmax()]
-min_bike = city.loc[city['bike_trips'].idxmin()]
-
-with open('figures/kpis_avanzados.txt', 'w') as f:
-    f.write(f"Mayor NO2: mes={max_no2['month']}, dow={max_no2['dow']}, hora={max_no2['hour']}, valor={max_no2['NO2']:.2f}\n")
-    f.write(f"Menor NO2: mes={min_no2['month']}, dow={min_no2['dow']}, hora={min_no2['hour']}, valor={min_no2['NO2']:.2f}\n")
-    f.write(f"Mayor viajes bici: mes={max_bike['month']}, dow={max_bike['dow']}, hora={max_bike['hour']}, valor={max_bike['bike_trips']:.0f}\n")
-    f.write(f"Menor viajes bici: mes={min_bike['month']}, dow={min_bike['dow']}, hora={min_bike['hour']}, valor={min_bike['bike_trips']:.0f}\n")
-print('KPIs avanzados guardados en figures/kpis_avanzados.txt')
-
-# --- Boxplots por mes, día de la semana y hora ---
-for var in ['NO2', 'bike_trips']:
-    plt.figure(figsize=(8,5))
-    sns.boxplot(x='month', y=var, data=city)
-    plt.title(f'Distribución de {var} por mes')
-    plt.tight_layout()
-    plt.savefig(f'figures/boxplot_{var}_mes.png')
-    plt.close()
-    plt.figure(figsize=(8,5))
-    sns.boxplot(x='dow', y=var, data=city)
-    plt.title(f'Distribución de {var} por día de la semana')
-    plt.tight_layout()
-    plt.savefig(f'figures/boxplot_{var}_dow.png')
-    plt.close()
-    plt.figure(figsize=(8,5))
-    sns.boxplot(x='hour', y=var, data=city)
-    plt.title(f'Distribución de {var} por hora')
-    plt.tight_layout()
-    plt.savefig(f'figures/boxplot_{var}_hora.png')
-    plt.close()
-
-# --- Matriz de correlación ---
-plt.figure(figsize=(10,8))
-corr = city[['NO2','PM10','PM2_5','NOx','O3','Veloc','Temp','bike_trips']].corr()
-sns.heatmap(corr, annot=True, cmap='coolwarm', fmt='.2f')
-plt.title('Matriz de correlación de variables')
-plt.tight_layout()
-plt.savefig('figures/correlacion_variables.png')
-plt.close()
-
-# --- Regresión lineal NO2 ~ bike_trips + Veloc + Temp ---
-from sklearn.linear_model import LinearRegression
-X = city[['bike_trips','Veloc','Temp']]
-y = city['NO2']
-reg = LinearRegression().fit(X, y)
-coefs = dict(zip(X.columns, reg.coef_))
-r2 = reg.score(X, y)
-with open('figures/regresion_NO2.txt', 'w') as f:
-    f.write(f"Intercept: {reg.intercept_:.2f}\n")
-    for var, coef in coefs.items():
-        f.write(f"Coef {var}: {coef:.4f}\n")
-    f.write(f"R2: {r2:.4f}\n")
-print('Resultados de regresión guardados en figures/regresion_NO2.txt')
-
-# --- Comparativa laborables vs. fines de semana ---
-city['is_weekend'] = city['dow'].apply(lambda x: 1 if x in [5,6] else 0)
-for var in ['NO2','bike_trips']:
-    plt.figure(figsize=(6,4))
-    sns.boxplot(x='is_weekend', y=var, data=city)
-    plt.title(f'{var}: Laborables (0) vs. Finde (1)')
-    plt.tight_layout()
-    plt.savefig(f'figures/boxplot_{var}_weekend.png')
-    plt.close()
+import analytics
+from storage import read_years
+
+FIG_DIR = Path('figures')
+CACHE = FIG_DIR / '.figcache.json'
+STYLE_VERSION = 1                          # súbelo si cambia el código de dibujo
+
+
+# --- Dibujo (se ejecuta en los procesos del pool) ---
+def _plt():
+    import matplotlib
+    matplotlib.use('Agg')                  # sin ventana: sólo ficheros
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _draw_series(plt, sns, data, title):
+    plt.figure(figsize=(12,5))
+    plt.plot(data['NO2'], label='NO2')
+    plt.plot(data['bike_trips'], label='Viajes Bici', alpha=0.7)
+    plt.title(title)
+    plt.xlabel('Índice temporal')
+    plt.ylabel('Valor')
+    plt.legend()
+
 
-# --- Evolución mensual de contaminación y uso bici ---
-for var in ['NO2','bike_trips']:
+def _draw_heatmap(plt, sns, data, title, cmap, annot=False, xlabel=None, ylabel=None):
+    plt.figure(figsize=(10,8) if annot else (8,6))
+    sns.heatmap(data, cmap=cmap, annot=annot, fmt='.2f')
+    plt.title(title)
+    if ylabel: plt.ylabel(ylabel)
+    if xlabel: plt.xlabel(xlabel)
+
+
+def _draw_scatter(plt, sns, data, x, y, title, xlabel, ylabel):
+    plt.figure(figsize=(7,5))
+    sns.scatterplot(data=data, x=x, y=y, alpha=0.6)
+    plt.title(title)
+    plt.xlabel(xlabel)
+    plt.ylabel(ylabel)
+
+
+def _draw_box(plt, sns, data, x, y, title, size=(8,5)):
+    plt.figure(figsize=size)
+    sns.boxplot(x=x, y=y, data=data)
+    plt.title(title)
+
+
+def _draw_line(plt, sns, data, title, xlabel, ylabel):
     plt.figure(figsize=(8,5))
-    city.groupby('month')[var].mean().plot(marker='o')
-    plt.title(f'Evolución mensual de {var}')
-    plt.xlabel('Mes')
-    plt.ylabel(var)
-    plt.tight_layout()
-    plt.savefig(f'figures/evolucion_mensual_{var}.png')
-    plt.close()
-
-# --- Top 5 estaciones con más/menos NO2 y uso bici ---
-spatial_mean = spatial.groupby('codigo_estacion').agg({'NO2':'mean','prestamos_mean':'mean'}).reset_index()
-top5_no2 = spatial_mean.nlargest(5, 'NO2')
-bot5_no2 = spatial_mean.nsmallest(5, 'NO2')
-top5_bike = spatial_mean.nlargest(5, 'prestamos_mean')
-bot5_bike = spatial_mean.nsmallest(5, 'prestamos_mean')
-top5_no2.to_csv('figures/top5_no2.csv', index=False)
-bot5_no2.to_csv('figures/bot5_no2.csv', index=False)
-top5_bike.to_csv('figures/top5_bike.csv', index=False)
-bot5_bike.to_csv('figures/bot5_bike.csv', index=False)
-print('Top estaciones guardadas en figures/')
-
-# --- Mapa de estaciones (NO2 y uso bici) ---
-# (Solo como scatter, sin mapa interactivo aún)
-if 'lat' in spatial.columns and 'lon' in spatial.columns:
+    data.plot(marker='o')
+    plt.title(title)
+    plt.xlabel(xlabel)
+    plt.ylabel(ylabel)
+
+
+def _draw_map(plt, sns, data, title):
     plt.figure(figsize=(8,6))
-    plt.scatter(spatial['lon'], spatial['lat'], c=spatial['NO2'], cmap='Reds', s=spatial['prestamos_mean']*10+10, alpha=0.7)
+    plt.scatter(data['lon'], data['lat'], c=data['NO2'], cmap='Reds', s=data['prestamos_mean']*10+10, alpha=0.7)
     plt.colorbar(label='NO2')
-    plt.title('Estaciones: color=NO2, tamaño=uso bici')
+    plt.title(title)
     plt.xlabel('Longitud')
     plt.ylabel('Latitud')
-    plt.tight_layout()
-    plt.savefig('figures/mapa_estaciones_no2_bici.png')
-    plt.close()
-else:
-    print('No hay columnas lat/lon en spatial para mapa de estaciones.')
 
-print('EDA avanzada completada. Revisa la carpeta figures.')
 
-print('Gráficos guardados en la carpeta figures/') 
\ No newline at end of file
+DRAW = {'series': _draw_series, 'heatmap': _draw_heatmap, 'scatter': _draw_scatter,
+        'box': _draw_box, 'line': _draw_line, 'map': _draw_map}
+
+
+def render(fig):
+    """Dibuja una figura (fichero, tipo, datos, parámetros) y la guarda."""
+    name, kind, data, params = fig
+    plt = _plt()
+    import seaborn as sns
+    DRAW[kind](plt, sns, data, **params)
+    plt.tight_layout()
+    plt.savefig(FIG_DIR / name)
+    plt.close('all')
+    return name
+
+
+# --- Caché por hash de datos + parámetros ---
+def fig_hash(fig):
+    name, kind, data, params = fig
+    h = hashlib.sha256(f'{STYLE_VERSION}|{name}|{kind}|{sorted(params.items())!r}'.encode())
+    h.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    h.update(repr(list(data.columns) if hasattr(data, 'columns') else data.name).encode())
+    return h.hexdigest()
+
+
+def render_all(figs, jobs=None, force=False):
+    """Dibuja en paralelo las figuras cuyo hash cambió; devuelve (dibujadas, saltadas)."""
+    try:
+        cache = json.loads(CACHE.read_text(encoding='utf-8'))
+    except (FileNotFoundError, json.JSONDecodeError):
+        cache = {}
+    hashes = {f[0]: fig_hash(f) for f in figs}
+    todo = [f for f in figs
+            if force or cache.get(f[0]) != hashes[f[0]] or not (FIG_DIR / f[0]).exists()]
+    if todo:
+        jobs = min(jobs or os.cpu_count() or 1, len(todo))
+        if jobs == 1:
+            done = [render(f) for f in todo]
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                done = list(pool.map(render, todo))
+        cache.update({n: hashes[n] for n in done})
+        CACHE.write_text(json.dumps(cache, indent=1, sort_keys=True), encoding='utf-8')
+    return len(todo), len(figs) - len(todo)
+
+
+# --- Figuras ---
+def figures(city, spatial):
+    """Lista de figuras: cada una lleva sólo los datos que dibuja."""
+    figs = [
+        ('serie_NO2_bici.png', 'series', city[['NO2', 'bike_trips']],
+         dict(title='Evolución NO2 y Viajes en Bici (Ciudad)')),
+        ('heatmap_NO2.png', 'heatmap',
+         city.pivot_table(index='hour', columns='dow', values='NO2', aggfunc='mean'),
+         dict(title='Heatmap NO2 por hora y día de la semana', cmap='coolwarm',
+              xlabel='Día de la semana (0=Lunes)', ylabel='Hora')),
+        ('heatmap_bike.png', 'heatmap',
+         city.pivot_table(index='hour', columns='dow', values='bike_trips', aggfunc='mean'),
+         dict(title='Heatmap Viajes Bici por hora y día de la semana', cmap='YlGnBu',
+              xlabel='Día de la semana (0=Lunes)', ylabel='Hora')),
+        ('scatter_NO2_bici.png', 'scatter', city[['bike_trips', 'NO2']],
+         dict(x='bike_trips', y='NO2', title='Relación NO2 vs Viajes en Bici (Ciudad)',
+              xlabel='Viajes en Bici', ylabel='NO2')),
+    ]
+    # Boxplots por mes, día de la semana y hora
+    for var in ['NO2', 'bike_trips']:
+        for dim, etiqueta, sufijo in [('month', 'mes', 'mes'), ('dow', 'día de la semana', 'dow'),
+                                      ('hour', 'hora', 'hora')]:
+            figs.append((f'boxplot_{var}_{sufijo}.png', 'box', city[[dim, var]],
+                         dict(x=dim, y=var, title=f'Distribución de {var} por {etiqueta}')))
+    # Matrices de correlación (Pearson y Spearman)
+    corr_vars = ['NO2','PM10','PM2_5','NOx','O3','Veloc','Temp','bike_trips']
+    for metodo, fichero in [('pearson', 'correlacion_variables'), ('spearman', 'correlacion_spearman')]:
+        figs.append((f'{fichero}.png', 'heatmap', getattr(analytics, metodo)(city, corr_vars),
+                     dict(title=f'Matriz de correlación de variables ({metodo.capitalize()})',
+                          cmap='coolwarm', annot=True)))
+    # Comparativa laborables vs. fines de semana
+    for var in ['NO2','bike_trips']:
+        figs.append((f'boxplot_{var}_weekend.png', 'box', city[['is_weekend', var]],
+                     dict(x='is_weekend', y=var, title=f'{var}: Laborables (0) vs. Finde (1)',
+                          size=(6,4))))
+    # Evolución mensual de contaminación y uso bici
+    for var in ['NO2','bike_trips']:
+        figs.append((f'evolucion_mensual_{var}.png', 'line', city.groupby('month')[var].mean(),
+                     dict(title=f'Evolución mensual de {var}', xlabel='Mes', ylabel=var)))
+    # Mapa de estaciones (NO2 y uso bici; sólo como scatter, sin mapa interactivo aún)
+    if 'lat' in spatial.columns and 'lon' in spatial.columns:
+        figs.append(('mapa_estaciones_no2_bici.png', 'map', spatial[['lon','lat','NO2','prestamos_mean']],
+                     dict(title='Estaciones: color=NO2, tamaño=uso bici')))
+    else:
+        print('No hay columnas lat/lon en spatial para mapa de estaciones.')
+    return figs
+
+
+def main():
+    ap = argparse.ArgumentParser(description='EDA Valenbisi × calidad del aire')
+    ap.add_argument('years', type=int, nargs='*',
+                    help='años a analizar (por defecto, todos)')
+    ap.add_argument('--jobs', type=int, default=None,
+                    help='procesos de dibujo (1 = en serie; por defecto, nº de CPUs)')
+    ap.add_argument('--force', action='store_true', help='redibuja todas las figuras')
+    args = ap.parse_args()
+
+    # Crear carpeta para guardar figuras
+    FIG_DIR.mkdir(exist_ok=True)
+
+    # Cargar datasets principales (sólo las particiones de esos años)
+    city = read_years('city_bike_air', args.years or None, columns=['month','dow','hour','bike_trips','NO2','PM10','PM2_5','NOx','O3','Veloc','Temp'])
+    spatial = read_years('bike_air_spatial_hour', args.years or None, columns=['codigo_estacion','NO2','prestamos_mean'])
+    city['is_weekend'] = (city['dow'] >= 5).astype('int16')
+
+    # --- KPIs básicos ---
+    # Media y desviación de contaminantes y viajes
+    kpis = analytics.kpis(city, ['NO2', 'PM10', 'PM2_5', 'O3', 'bike_trips'])
+    kpis.T.to_csv('figures/kpis_city.csv')           # estadísticos en filas, como siempre
+    print('KPIs guardados en figures/kpis_city.csv')
+
+    # --- KPIs avanzados ---
+    # Día y hora con mayor y menor contaminación y uso
+    max_no2 = city.loc[city['NO2'].idxmax()]
+    min_no2 = city.loc[city['NO2'].idxmin()]
+    max_bike = city.loc[city['bike_trips'].idxmax()]
+    min_bike = city.loc[city['bike_trips'].idxmin()]
+
+    with open('figures/kpis_avanzados.txt', 'w') as f:
+        f.write(f"Mayor NO2: mes={max_no2['month']}, dow={max_no2['dow']}, hora={max_no2['hour']}, valor={max_no2['NO2']:.2f}\n")
+        f.write(f"Menor NO2: mes={min_no2['month']}, dow={min_no2['dow']}, hora={min_no2['hour']}, valor={min_no2['NO2']:.2f}\n")
+        f.write(f"Mayor viajes bici: mes={max_bike['month']}, dow={max_bike['dow']}, hora={max_bike['hour']}, valor={max_bike['bike_trips']:.0f}\n")
+        f.write(f"Menor viajes bici: mes={min_bike['month']}, dow={min_bike['dow']}, hora={min_bike['hour']}, valor={min_bike['bike_trips']:.0f}\n")
+    print('KPIs avanzados guardados en figures/kpis_avanzados.txt')
+
+    # --- Regresión lineal NO2 ~ bike_trips + Veloc + Temp (global y por mes) ---
+    reg_x = ['bike_trips','Veloc','Temp']
+    X = city[reg_x].to_numpy('float64')
+    y = city['NO2'].to_numpy('float64')
+    reg = analytics.ols(X, y)
+    with open('figures/regresion_NO2.txt', 'w') as f:
+        f.write(f"Intercept: {reg['intercept']:.2f}\n")
+        for var, coef in zip(reg_x, reg['coef']):
+            f.write(f"Coef {var}: {coef:.4f}\n")
+        f.write(f"R2: {reg['r2']:.4f}\n")
+    analytics.ols_groups(X, y, city['month'], reg_x).to_csv('figures/regresion_NO2_mes.csv')
+    print('Resultados de regresión guardados en figures/regresion_NO2.txt y figures/regresion_NO2_mes.csv')
+
+    # --- Top 5 estaciones con más/menos NO2 y uso bici ---
+    spatial_mean = spatial.groupby('codigo_estacion').agg({'NO2':'mean','prestamos_mean':'mean'}).reset_index()
+    spatial_mean.nlargest(5, 'NO2').to_csv('figures/top5_no2.csv', index=False)
+    spatial_mean.nsmallest(5, 'NO2').to_csv('figures/bot5_no2.csv', index=False)
+    spatial_mean.nlargest(5, 'prestamos_mean').to_csv('figures/top5_bike.csv', index=False)
+    spatial_mean.nsmallest(5, 'prestamos_mean').to_csv('figures/bot5_bike.csv', index=False)
+    print('Top estaciones guardadas en figures/')
+
+    # --- Figuras (en paralelo, sólo las que cambiaron) ---
+    dibujadas, saltadas = render_all(figures(city, spatial), args.jobs, args.force)
+    print(f'Figuras: {dibujadas} dibujadas, {saltadas} sin cambios.')
+
+    print('EDA avanzada completada. Revisa la carpeta figures.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+fetcher.py
+----------
+Descargas de Opendatasoft con espejo local en data/raw/.
+
+  · Una sesión HTTP compartida (pool de conexiones + reintentos con backoff).
+  · Peticiones condicionales: el ETag / Last-Modified de la última descarga
+    se guarda en data/raw/mirror.json; un 304 no vuelve a bajar nada.
+  · Descarga en streaming por bloques a un temporal; el fichero del espejo
+    sólo se sustituye si el contenido cambió (su mtime no se toca si no).
+  · `fetch_all()` baja varios datasets a la vez (hilos: la espera es de red).
+  · Offline-first: si la descarga falla se usa la copia del espejo. Con
+    OFFLINE=True (--offline / VALENBISI_OFFLINE=1) no se hace ninguna
+    petición y falta algo en el espejo es un error.
+
+BASE_URL (--base-url / VALENBISI_BASE_URL) permite apuntar a un servidor
+local que imite la API, p.ej. `python -m http.server` sobre un árbol
+api/explore/v2.1/catalog/datasets/<id>/exports/csv.
+"""
+from __future__ import annotations
+import hashlib, json, os, tempfile, threading, warnings
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import storage
+from build_manifest import file_hash
+
+RAW_DIR = storage.DATA_DIR / "raw"
+BASE_URL = os.environ.get("VALENBISI_BASE_URL", "https://valencia.opendatasoft.com")
+EXPORT = "/api/explore/v2.1/catalog/datasets/{}/exports/csv?limit=-1"
+OFFLINE = os.environ.get("VALENBISI_OFFLINE", "") not in ("", "0")
+TIMEOUT = (10, 120)                                   # (conexión, lectura) s
+CHUNK = 1 << 20                                      # 1 MiB por bloque
+META = "mirror.json"
+
+_session: requests.Session | None = None
+_lock = threading.Lock()
+_done: set[str] = set()                              # ya sincronizados en este proceso
+
+
+def url_for(dataset: str) -> str:
+    return BASE_URL.rstrip("/") + EXPORT.format(dataset)
+
+
+def session() -> requests.Session:
+    """Sesión compartida: keep-alive y 3 reintentos ante errores transitorios."""
+    global _session
+    with _lock:
+        if _session is None:
+            retry = Retry(total=3, backoff_factor=0.5, allowed_methods=["GET"],
+                          status_forcelist=[429, 500, 502, 503, 504])
+            s = requests.Session()
+            s.mount("http://", HTTPAdapter(max_retries=retry, pool_maxsize=8))
+            s.mount("https://", HTTPAdapter(max_retries=retry, pool_maxsize=8))
+            _session = s
+        return _session
+
+
+# ── metadatos del espejo ──
+def _meta_path(out: Path) -> Path:
+    return out.parent / META
+
+
+def _read_meta(out: Path) -> dict:
+    try:
+        return json.loads(_meta_path(out).read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_meta(out: Path, rec: dict) -> None:
+    with _lock:                                      # varios hilos, un mismo json
+        meta = _read_meta(out)
+        meta[out.name] = rec
+        tmp = _meta_path(out).with_suffix(".tmp")
+        tmp.write_text(json.dumps(meta, indent=1, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, _meta_path(out))
+
+
+# ── descarga ──
+def fetch(dataset: str, out: Path | None = None) -> Path:
+    """Sincroniza el export CSV de `dataset` con el espejo y devuelve su ruta."""
+    out = Path(out or RAW_DIR / f"{dataset}.csv")
+    key = out.resolve().as_posix()
+    if key in _done:
+        return out
+    if OFFLINE:
+        if not out.exists():
+            raise FileNotFoundError(f"modo offline: falta {out} en el espejo")
+        _done.add(key)
+        return out
+
+    url = url_for(dataset)
+    rec = _read_meta(out).get(out.name, {})
+    headers = {}
+    if out.exists() and rec.get("url") == url:
+        if rec.get("etag"):
+            headers["If-None-Match"] = rec["etag"]
+        if rec.get("last_modified"):
+            headers["If-Modified-Since"] = rec["last_modified"]
+    try:
+        with session().get(url, headers=headers, stream=True, timeout=TIMEOUT) as r:
+            if r.status_code == 304:
+                _done.add(key)
+                return out
+            r.raise_for_status()
+            out.parent.mkdir(parents=True, exist_ok=True)
+            h = hashlib.sha256()
+            fd, tmp = tempfile.mkstemp(dir=out.parent, prefix=f".{out.name}.")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for block in r.iter_content(CHUNK):
+                        f.write(block)
+                        h.update(block)
+                if out.exists() and h.hexdigest() == file_hash(out):
+                    os.remove(tmp)                   # igual que el espejo: mtime intacto
+                else:
+                    os.replace(tmp, out)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            _write_meta(out, {"url": url, "etag": r.headers.get("ETag"),
+                              "last_modified": r.headers.get("Last-Modified"),
+                              "sha256": h.hexdigest()})
+    except requests.RequestException as e:
+        if not out.exists():
+            raise
+        warnings.warn(f"{dataset}: descarga fallida ({e.__class__.__name__}); "
+                      f"se usa la copia del espejo {out}")
+    _done.add(key)
+    return out
+
+
+def fetch_all(jobs: dict[str, tuple[str, Path | None]],
+              workers: int | None = None) -> dict[str, Path]:
+    """{nombre: (dataset, ruta)} → {nombre: ruta}, descargando en paralelo."""
+    with ThreadPoolExecutor(max_workers=workers or len(jobs) or 1) as pool:
+        futs = {k: pool.submit(fetch, ds, out) for k, (ds, out) in jobs.items()}
+        return {k: f.result() for k, f in futs.items()}
@@ -0,0 +1,141 @@
+"""
+lagged.py
+---------
+Respuesta de la contaminación al tráfico de bicis a lo largo de las horas.
+
+Sobre la serie horaria completa del año (rejilla de 8.760 h, timeseries.py):
+
+  lag_air       correlación de los viajes bici de la ciudad en t con NO2,
+                PM10 y PM2_5 de cada estación de aire en t + lag, lag 0…48 h
+  lag_bike      lo mismo por estación bici, con su estación de aire más
+                cercana que mida NO2
+  rolling_air   media y varianza móviles del NO2 de cada estación de aire y
+                su correlación móvil con los viajes (ventana de una semana)
+
+Los exports de Valenbisi no traen serie horaria por estación (ver
+timeseries.py), así que la de cada estación bici se estima repartiendo la
+serie de la ciudad según su perfil horario de préstamos (bike_station_hour).
+
+Todo es vectorizado (analytics.py): las correlaciones cruzadas de todas las
+estaciones y todos los lags salen de FFT en una llamada y las ventanas
+móviles de sumas acumuladas en O(n), sin recalcular cada ventana. El
+pipeline materializa las tres tablas por año; el dashboard sólo las lee, y
+la ventana móvil de una estación bici se calcula al pedirla (`bike_rolling`).
+"""
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+import analytics
+import storage
+import timeseries
+from station_index import StationIndex
+from storage import POLLUTANTS
+
+MAX_LAG = 48                                         # h
+WINDOW = 24 * 7                                      # h de la ventana móvil
+MIN_PERIODS = WINDOW // 2
+TABLES = ["lag_air", "lag_bike", "rolling_air"]
+
+
+def air_matrix(air_full: pd.DataFrame, year: int, col: str) -> tuple[np.ndarray, np.ndarray]:
+    """(station_id, matriz estación × hora del año) de `col`; fuera las
+    estaciones que no la miden."""
+    grid = timeseries.hourly_grid(year)
+    if col not in air_full:
+        return np.empty(0, "int64"), np.empty((0, len(grid)))
+    t = ((air_full["datetime"] - grid[0]) // pd.Timedelta(hours=1)).to_numpy()
+    ids, st = np.unique(air_full["station_id"].to_numpy(), return_inverse=True)
+    ok = (t >= 0) & (t < len(grid))
+    m = np.full((len(ids), len(grid)), np.nan)
+    m[st[ok], t[ok]] = air_full[col].to_numpy("float64")[ok]
+    has = ~np.isnan(m).all(axis=1)
+    return ids[has], m[has]
+
+
+def bike_station_matrix(bike_hourly: pd.DataFrame, bike_hour: pd.DataFrame,
+                        stations=None) -> tuple[np.ndarray, np.ndarray]:
+    """Serie horaria estimada por estación bici: la de la ciudad en t por la
+    fracción de préstamos de la estación a la hora del día de t."""
+    prof = bike_hour.pivot_table(index="codigo_estacion", columns="hour",
+                                 values="prestamos_mean", aggfunc="sum").reindex(columns=range(24))
+    share = (prof / prof.sum()).fillna(0.0)
+    if stations is not None:
+        share = share.reindex([int(s) for s in stations])
+    hours = bike_hourly["datetime"].dt.hour.to_numpy()
+    city = bike_hourly["bike_trips_est"].to_numpy("float64")
+    return share.index.to_numpy(), share.to_numpy()[:, hours] * city
+
+
+_EMPTY = (np.empty((0, MAX_LAG + 1)), np.empty((0, MAX_LAG + 1), "int64"))   # (r, n) sin series
+
+
+def _long(r: np.ndarray, n: np.ndarray, keys: dict) -> pd.DataFrame:
+    """(k, lags) → filas clave × lag con r y n."""
+    k, lags = r.shape
+    return pd.DataFrame({**{c: np.repeat(np.asarray(v), lags) for c, v in keys.items()},
+                         "lag": np.tile(np.arange(lags), k),
+                         "r": r.ravel(), "n": n.ravel()})
+
+
+def nearest_no2(idx: StationIndex, air_ids, bike_ids) -> np.ndarray:
+    """Estación de aire más cercana con NO2 de cada estación bici (-1 sin coordenadas)."""
+    st_b = idx.stations[idx.stations["kind"] == "bike"].set_index("station_id")
+    coords = st_b.reindex(bike_ids)[["lat", "lon"]]
+    out = np.full(len(bike_ids), -1)
+    has = coords.notna().all(axis=1).to_numpy()
+    if has.any():
+        _, near = idx.subset("air", air_ids).query_knn(coords["lat"].to_numpy()[has],
+                                                        coords["lon"].to_numpy()[has], k=1)
+        out[has] = near[:, 0]
+    return out
+
+
+def build(bike_c: pd.DataFrame, bike_hour: pd.DataFrame, air_full: pd.DataFrame,
+          idx: StationIndex, year: int) -> dict[str, pd.DataFrame]:
+    """Las tres tablas de `year` (ver cabecera)."""
+    bike_hourly = timeseries.bike_city_hourly(bike_c, year)
+    x = bike_hourly["bike_trips_est"].to_numpy("float64")
+
+    parts = []
+    for var, col in POLLUTANTS.items():
+        ids, m = air_matrix(air_full, year, col)
+        if len(ids):
+            r, n = analytics.xcorr(x, m, MAX_LAG)
+            parts.append(_long(r, n, {"station_id": ids, "variable": np.array([var] * len(ids))}))
+    if not parts:
+        print(f"  ⚠ {year}: ninguna estación mide {', '.join(POLLUTANTS)}; tablas de retardos vacías")
+    lag_air = (pd.concat(parts, ignore_index=True) if parts
+               else _long(*_EMPTY, {"station_id": np.empty(0, "int64"),
+                                    "variable": np.empty(0, "str")}))
+
+    # estación bici ↔ NO2 de su estación de aire más cercana que lo mida
+    no2_ids, no2 = air_matrix(air_full, year, "NO2")
+    bike_ids, xb = bike_station_matrix(bike_hourly, bike_hour)
+    near = nearest_no2(idx, no2_ids, bike_ids) if len(no2_ids) else np.full(len(bike_ids), -1)
+    ok = near >= 0
+    row = pd.Index(no2_ids).get_indexer(near[ok])
+    r, n = analytics.xcorr(xb[ok], no2[row], MAX_LAG)
+    lag_bike = _long(r, n, {"codigo_estacion": bike_ids[ok], "nearest_no2_station": near[ok]})
+
+    roll = analytics.rolling(no2, WINDOW, np.broadcast_to(x, no2.shape), MIN_PERIODS)
+    grid = bike_hourly["datetime"].to_numpy()
+    rolling_air = pd.DataFrame({"station_id": np.repeat(no2_ids, len(grid)),
+                                "datetime": np.tile(grid, len(no2_ids)),
+                                "NO2_mean": roll["mean"].ravel(), "NO2_var": roll["var"].ravel(),
+                                "NO2_bike_corr": roll["corr"].ravel()})
+    return {"lag_air": lag_air, "lag_bike": lag_bike, "rolling_air": rolling_air}
+
+
+def bike_rolling(year: int, station: int, air_station: int) -> pd.DataFrame:
+    """Ventana móvil de la estación bici `station` (viajes estimados) y su
+    correlación con el NO2 de `air_station`, leyendo sólo esas series."""
+    bike_hourly = storage.read_table(timeseries.BIKE_HOURLY, year=year)
+    bike_hour = storage.read_table("bike_station_hour", year=year)
+    _, xb = bike_station_matrix(bike_hourly, bike_hour, [station])
+    grid = bike_hourly["datetime"]
+    no2 = (timeseries.query(grid.iloc[0], grid.iloc[-1] + pd.Timedelta(hours=1),
+                            stations=[air_station], columns=["NO2"])
+           .set_index("datetime")["NO2"].reindex(grid.to_numpy()).to_numpy("float64"))
+    roll = analytics.rolling(xb[0], WINDOW, no2, MIN_PERIODS)
+    return pd.DataFrame({"datetime": grid, "bike_mean": roll["mean"], "bike_var": roll["var"],
+                         "NO2_bike_corr": roll["corr"]})
@@ -0,0 +1,123 @@
+"""
+query.py
+--------
+Motor de consultas SQL embebido (DuckDB, en el mismo proceso) sobre las
+tablas del pipeline.
+
+Cada tabla se lee directamente de sus ficheros (storage.sources): las
+particiones Parquet con hive_partitioning, así un `year = ?` sólo abre ese
+año, y las que sólo tienen CSV versionado con read_csv. DuckDB baja los
+filtros (mes, estación, hora…) al lector de Parquet, que salta los row
+groups por sus estadísticas min/max, y sólo lee las columnas del SELECT:
+una vista filtrada cuesta en proporción al resultado y no a la tabla.
+
+Las consultas del dashboard son parametrizadas (los valores van como `?`
+y nunca se interpolan en el SQL):
+
+  city(year, month, weekend, hours, columns)   filas ciudad mes × dow × hora
+  station_hour(year, station)                  perfil horario de una estación
+  rolling_air(year, station)                   NO2 en ventana móvil (lagged.py)
+
+`run()` ejecuta cualquier otra. Los resultados se guardan en una caché LRU
+(CACHE_SIZE entradas) por (SQL, parámetros, huella de los ficheros), así
+que se invalida sola cuando el pipeline reescribe una tabla. Los frames de
+la caché se comparten: no se deben modificar.
+"""
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable, Sequence
+from pathlib import Path
+import duckdb
+import pandas as pd
+import storage
+
+CACHE_SIZE = 128
+CITY = "city_bike_air"
+SPATIAL = "bike_air_spatial_hour"
+ROLLING = "rolling_air"
+
+_con: duckdb.DuckDBPyConnection | None = None
+_cache: OrderedDict = OrderedDict()
+_lock = threading.Lock()                             # una conexión para todas las sesiones
+
+
+def connect() -> duckdb.DuckDBPyConnection:
+    global _con
+    if _con is None:
+        _con = duckdb.connect()                      # en memoria: sólo lee ficheros
+    return _con
+
+
+def _str(p: Path) -> str:
+    return "'" + p.as_posix().replace("'", "''") + "'"
+
+
+def ident(col: str) -> str:
+    return '"' + col.replace('"', '""') + '"'
+
+
+def source(name: str, files: list[tuple[int, Path]] | None = None) -> str:
+    """Subconsulta con todas las particiones de `name` (columna year incluida)."""
+    files = storage.sources(name) if files is None else files
+    if not files:
+        raise FileNotFoundError(f"{name}: no hay particiones por año en {storage.DATA_DIR}")
+    pq_files = [f for _, f in files if f.suffix == ".parquet"]
+    parts = ([f"SELECT * FROM read_parquet([{', '.join(map(_str, pq_files))}], "
+              f"hive_partitioning = true)"] if pq_files else [])
+    parts += [f"SELECT *, {y}::SMALLINT AS year FROM read_csv({_str(f)})"
+              for y, f in files if f.suffix != ".parquet"]
+    return "(" + " UNION ALL BY NAME ".join(parts) + ")"
+
+
+def run(sql: str, params: Sequence = (), tables: Iterable[str] = ()) -> pd.DataFrame:
+    """Ejecuta `sql` con `params`; cada `{tabla}` de `tables` se sustituye por
+    sus ficheros. El resultado queda en la caché hasta que cambien."""
+    files = {t: storage.sources(t) for t in tables}
+    key = (sql, tuple(params), storage.stamp(f for fs in files.values() for _, f in fs))
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+        text = sql.format(**{t: source(t, fs) for t, fs in files.items()})
+        df = storage.apply_schema(connect().execute(text, list(params)).df())
+        _cache[key] = df
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return df
+
+
+def clear_cache() -> None:
+    with _lock:
+        _cache.clear()
+
+
+def city(year: int, month: int | None = None, weekend: bool | None = None,
+         hours: tuple[int, int] | None = None,
+         columns: list[str] | None = None) -> pd.DataFrame:
+    """Filas ciudad (mes × dow × hora, con is_weekend) de `year`, filtradas por
+    mes, laborable/finde y rango de horas [desde, hasta]; sólo `columns`."""
+    where, params = ["year = ?"], [year]
+    if month:
+        where.append("month = ?"); params.append(month)
+    if weekend is not None:
+        where.append("is_weekend = ?"); params.append(int(weekend))
+    if hours is not None:
+        where.append("hour BETWEEN ? AND ?"); params += [int(hours[0]), int(hours[1])]
+    cols = ", ".join(map(ident, columns)) if columns else "* EXCLUDE (year)"
+    return run(f"SELECT {cols} FROM (SELECT *, (dow >= 5)::SMALLINT AS is_weekend FROM {{{CITY}}}) "
+               f"WHERE {' AND '.join(where)} ORDER BY month, dow, hour", params, [CITY])
+
+
+def station_hour(year: int, station: int) -> pd.DataFrame:
+    """Perfil horario (NO2, prestamos_mean) de la estación bici `station`."""
+    return run(f"SELECT hour, NO2, prestamos_mean FROM {{{SPATIAL}}} "
+               "WHERE year = ? AND codigo_estacion = ? ORDER BY hour",
+               [year, int(station)], [SPATIAL])
+
+
+def rolling_air(year: int, station: int) -> pd.DataFrame:
+    """Media, varianza y correlación con la bici del NO2 de `station` en ventana móvil."""
+    return run(f"SELECT datetime, NO2_mean, NO2_var, NO2_bike_corr FROM {{{ROLLING}}} "
+               "WHERE year = ? AND station_id = ? ORDER BY datetime",
+               [year, int(station)], [ROLLING])
@@ -0,0 +1,227 @@
+"""
+runlog.py
+---------
+Instrumentación de las etapas del pipeline.
+
+`@stage("nombre")` envuelve una etapa y añade una línea JSON a
+data/run_log.jsonl con:
+
+  run_id, stage, year, pid, ts      ejecución (común a los procesos hijos)
+  status                            ok | cached (el manifiesto la dio por
+                                    buena y no escribió nada) | error
+  wall_s, cpu_s                     pared y CPU del hilo de la etapa (más la
+                                    de los procesos hijos que esperó, p.ej. el
+                                    parseo de air_txt/ en paralelo)
+  peak_rss_mb, peak_growth_mb       pico de RSS del proceso al acabar y cuánto
+                                    lo subió la etapa
+  concurrent                        hubo otras etapas en marcha en otros hilos
+                                    del proceso: el pico de RSS es del proceso
+                                    y no sólo de esta etapa
+  rows_in, rows_out                 filas de los DataFrame de entrada y salida
+                                    (de los frames en memoria, sin releer)
+  files_written, bytes_written      lo que la etapa anotó en el manifiesto
+  parent, profile                   etapa que la llamó; fichero de perfil
+
+Con `configure(profile="cprofile" | "pyinstrument")` cada etapa (o sólo las
+de `profile_stages`) se perfila y el resultado queda en data/profiles/
+(.prof para snakeviz / pstats, .html con pyinstrument); si hay etapas en
+paralelo en hilos, sólo se perfila una a la vez. La configuración se
+exporta a variables de entorno para que la vean los procesos de --jobs.
+"""
+from __future__ import annotations
+import cProfile, functools, json, os, sys, threading, time
+from pathlib import Path
+import pandas as pd
+import storage
+from build_manifest import ON_RECORD
+
+LOG = Path(os.environ.get("VALENBISI_RUN_LOG") or storage.DATA_DIR / "run_log.jsonl")
+PROFILE_DIR = storage.DATA_DIR / "profiles"
+PROFILERS = ("cprofile", "pyinstrument")
+
+RUN_ID = os.environ.get("VALENBISI_RUN_ID") or time.strftime("%Y%m%dT%H%M%S")
+PROFILE = os.environ.get("VALENBISI_PROFILE") or None
+PROFILE_STAGES = set(filter(None, os.environ.get("VALENBISI_PROFILE_STAGES", "").split(",")))
+CONTEXT: dict = {}                                   # campos fijos (p.ej. year)
+
+_local = threading.local()                           # etapas en curso (anidadas), por hilo
+_write_lock = threading.Lock()
+_profiling = threading.Lock()                        # un solo perfilador activo a la vez
+_running: dict[int, tuple[int, dict]] = {}           # etapas en curso en todos los hilos
+_running_lock = threading.Lock()
+
+
+def _stack() -> list[dict]:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def configure(run_id: str | None = None, profile: str | None = None,
+              profile_stages=None, log: Path | None = None) -> str:
+    """Fija la ejecución actual (y la exporta a los procesos hijos)."""
+    global RUN_ID, PROFILE, PROFILE_STAGES, LOG
+    if profile not in (None, *PROFILERS):
+        raise ValueError(f"perfilador desconocido: {profile} (usa {', '.join(PROFILERS)})")
+    RUN_ID = run_id or time.strftime("%Y%m%dT%H%M%S")
+    PROFILE, PROFILE_STAGES = profile, set(profile_stages or ())
+    LOG = Path(log or LOG)
+    os.environ.update(VALENBISI_RUN_ID=RUN_ID, VALENBISI_RUN_LOG=str(LOG),
+                      VALENBISI_PROFILE=PROFILE or "",
+                      VALENBISI_PROFILE_STAGES=",".join(sorted(PROFILE_STAGES)))
+    return RUN_ID
+
+
+def _rows(obj) -> list[int]:
+    if isinstance(obj, pd.DataFrame):
+        return [len(obj)]
+    if isinstance(obj, (tuple, list)):
+        return [n for o in obj for n in _rows(o)]
+    return []
+
+
+def _peak_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:                               # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+def _cpu() -> float:
+    """CPU de este hilo más la de los hijos ya esperados: con etapas en hilos
+    a la vez, no se cuenta la de las vecinas."""
+    t = os.times()
+    return time.thread_time() + t.children_user + t.children_system
+
+
+def _on_record(stage_name: str, outputs: list) -> None:
+    if _stack():
+        rec = _stack()[-1]
+        for f in map(Path, outputs):
+            if f.exists():
+                rec["files_written"] += 1
+                rec["bytes_written"] += f.stat().st_size
+
+
+ON_RECORD.append(_on_record)
+
+
+class _Profiler:
+    """cProfile o pyinstrument alrededor de una etapa (None si no toca)."""
+
+    def __init__(self, name: str):
+        self.name, self.impl = name, None
+        nested = any(r.get("profile") for r in _stack()[:-1])
+        if (PROFILE and not nested and (not PROFILE_STAGES or name in PROFILE_STAGES)
+                and _profiling.acquire(blocking=False)):      # en paralelo, sólo una a la vez
+            if PROFILE == "pyinstrument":
+                from pyinstrument import Profiler    # opcional: pip install pyinstrument
+                self.impl = Profiler()
+            else:
+                self.impl = cProfile.Profile()
+
+    def path(self) -> Path:
+        year = CONTEXT.get("year")
+        stem = f"{RUN_ID}_{self.name}" + (f"_{year}" if year is not None else "")
+        return PROFILE_DIR / (stem + (".html" if PROFILE == "pyinstrument" else ".prof"))
+
+    def start(self) -> None:
+        if self.impl is not None:
+            (self.impl.start if PROFILE == "pyinstrument" else self.impl.enable)()
+
+    def stop(self) -> str | None:
+        if self.impl is None:
+            return None
+        out = self.path()
+        out.parent.mkdir(parents=True, exist_ok=True)
+        if PROFILE == "pyinstrument":
+            self.impl.stop()
+            out.write_text(self.impl.output_html(), encoding="utf-8")
+        else:
+            self.impl.disable()
+            self.impl.dump_stats(out)
+        _profiling.release()
+        return out.as_posix()
+
+
+def write(rec: dict) -> None:
+    """Añade `rec` como una línea al log (append atómico de una sola escritura)."""
+    LOG.parent.mkdir(parents=True, exist_ok=True)
+    with _write_lock, open(LOG, "a", encoding="utf-8") as f:
+        f.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+
+
+def stage(name: str):
+    """Decorador: mide la etapa `name` y la anota en el log."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            rec = {"run_id": RUN_ID, "stage": name, **CONTEXT, "pid": os.getpid(),
+                   "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   "parent": _stack()[-1]["stage"] if _stack() else None,
+                   "rows_in": _rows(list(args) + list(kwargs.values())),
+                   "files_written": 0, "bytes_written": 0}
+            _stack().append(rec)
+            tid = threading.get_ident()
+            with _running_lock:
+                others = [r for t, r in _running.values() if t != tid]
+                for r in others:
+                    r["concurrent"] = True
+                rec["concurrent"] = bool(others)
+                _running[id(rec)] = (tid, rec)
+            prof = _Profiler(name)
+            rec["profile"] = prof.impl is not None
+            peak0, cpu0, t0 = _peak_mb(), _cpu(), time.perf_counter()
+            status, out = "error", None
+            prof.start()
+            try:
+                out = fn(*args, **kwargs)
+                status = "ok" if rec["files_written"] else "cached"
+                return out
+            except Exception as e:
+                rec["error"] = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                profile = prof.stop()
+                _stack().pop()
+                with _running_lock:
+                    del _running[id(rec)]
+                peak = _peak_mb()
+                rec.update(status=status, wall_s=round(time.perf_counter() - t0, 4),
+                           cpu_s=round(_cpu() - cpu0, 4),
+                           peak_rss_mb=peak and round(peak, 1),
+                           peak_growth_mb=peak and round(peak - peak0, 1),
+                           rows_out=_rows(out), profile=profile)
+                write(rec)
+        return wrapper
+    return deco
+
+
+def read(run_id: str | None = None) -> pd.DataFrame:
+    """Registros del log (de la ejecución `run_id`, o todos)."""
+    if not LOG.exists():
+        return pd.DataFrame()
+    with open(LOG, encoding="utf-8") as f:
+        recs = [json.loads(line) for line in f if line.strip()]
+    df = pd.DataFrame(recs)
+    return df[df["run_id"] == run_id].reset_index(drop=True) if run_id and len(df) else df
+
+
+def summary(run_id: str | None = None) -> str:
+    """Tabla de texto con las etapas de `run_id` (por defecto, la actual)."""
+    df = read(run_id or RUN_ID)
+    if df.empty:
+        return ""
+    lines = [f"  {'etapa':20s} {'año':>5s} {'estado':7s} {'pared s':>8s} {'CPU s':>7s} "
+             f"{'pico MB':>9s} {'filas':>10s} {'MB escritos':>11s}"]
+    shared = (df["concurrent"] == True) if "concurrent" in df else pd.Series(False, df.index)  # noqa: E712 (NaN en logs viejos)
+    for r, sh in zip(df.itertuples(), shared):
+        year = "" if pd.isna(getattr(r, "year", None)) else f"{int(r.year)}"
+        lines.append(f"  {r.stage:20s} {year:>5s} {r.status:7s} {r.wall_s:8.2f} {r.cpu_s:7.2f} "
+                     f"{r.peak_rss_mb or float('nan'):8.1f}{'*' if sh else ' '} {sum(r.rows_out):10,d} "
+                     f"{r.bytes_written / 2**20:11.2f}")
+    if shared.any():
+        lines.append("  * pico de RSS del proceso, compartido con etapas en paralelo")
+    return "\n".join(lines)
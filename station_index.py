@@ -0,0 +1,160 @@
+"""
+station_index.py
+----------------
+Índice espacial de estaciones (Valenbisi + calidad del aire).
+
+Un cKDTree por tipo de estación sobre coordenadas proyectadas a metros
+(equirectangular local centrada en la latitud media de todas las
+estaciones). Admite k vecinos, radio y caja lat/lon, y devuelve ids y
+distancias en metros.
+
+El pipeline lo construye y lo guarda en data/station_index.pkl;
+`load_index()` lo carga una vez por proceso (se recarga si cambia el
+fichero). Si aún no existe, se construye a partir de las coordenadas.
+"""
+from __future__ import annotations
+import pickle
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+import storage
+
+EARTH_R = 6_371_000.0                                 # m
+INDEX_FILE = "station_index.pkl"
+AIR_COORD = storage.DATA_DIR / "raw" / "air_station_coords.csv"   # manual (12 filas)
+
+
+def index_path() -> Path:
+    return storage.DATA_DIR / INDEX_FILE
+
+
+def to_metres(lat, lon, lat0: float) -> np.ndarray:
+    """Proyección equirectangular local (m) centrada en la latitud lat0."""
+    lat, lon = np.radians(np.asarray(lat, float)), np.radians(np.asarray(lon, float))
+    return np.column_stack([EARTH_R * lon * np.cos(np.radians(lat0)), EARTH_R * lat])
+
+
+class StationIndex:
+    """Árboles KD por tipo ("bike", "air") sobre una proyección común."""
+
+    def __init__(self, stations: pd.DataFrame, lat0: float | None = None):
+        # stations: station_id, kind, lat, lon
+        self.stations = stations[["station_id", "kind", "lat", "lon"]].reset_index(drop=True)
+        self.lat0 = float(self.stations["lat"].mean() if lat0 is None else lat0)
+        self._trees: dict[str, tuple[cKDTree, np.ndarray]] = {}
+        for kind, g in self.stations.groupby("kind"):
+            self._trees[kind] = (cKDTree(self.xy(g["lat"], g["lon"])), g.index.to_numpy())
+        self._trees[None] = (cKDTree(self.xy(self.stations["lat"], self.stations["lon"])),
+                             self.stations.index.to_numpy())
+        self._ids = self.stations["station_id"].to_numpy()
+        self._pos = {(k, int(i)): (la, lo) for k, i, la, lo in
+                     self.stations[["kind", "station_id", "lat", "lon"]].itertuples(index=False)}
+
+    @classmethod
+    def from_frames(cls, bike: pd.DataFrame, air: pd.DataFrame) -> "StationIndex":
+        """bike: codigo_estacion/lat/lon · air: station_id/lat/lon."""
+        st = pd.concat([
+            bike.rename(columns={"codigo_estacion": "station_id"})
+                [["station_id", "lat", "lon"]].assign(kind="bike"),
+            air[["station_id", "lat", "lon"]].assign(kind="air"),
+        ], ignore_index=True)
+        st["station_id"] = st["station_id"].astype(int)
+        return cls(st)
+
+    def subset(self, kind: str, ids) -> "StationIndex":
+        """Índice sólo con las estaciones `ids` de tipo `kind` (misma proyección)."""
+        st = self.stations
+        return StationIndex(st[(st["kind"] == kind) & st["station_id"].isin(list(ids))],
+                            lat0=self.lat0)
+
+    def xy(self, lat, lon) -> np.ndarray:
+        return to_metres(lat, lon, self.lat0)
+
+    def locate(self, station_id: int, kind: str = "bike") -> tuple[float, float]:
+        """(lat, lon) de una estación."""
+        return self._pos[(kind, int(station_id))]
+
+    # ── consultas en bloque (arrays) ──
+    def query_knn(self, lat, lon, k: int = 1, kind: str | None = None):
+        """(dist_m, station_id), ambos (n_puntos, k)."""
+        tree, rows = self._trees[kind]
+        k = min(k, tree.n)
+        dist, j = tree.query(self.xy(np.atleast_1d(lat), np.atleast_1d(lon)),
+                             k=[*range(1, k + 1)])
+        return dist, self._ids[rows[j]]
+
+    def query_radius(self, lat: float, lon: float, r_m: float, kind: str | None = None):
+        """(station_id, dist_m) de las estaciones a ≤ r_m, ordenadas por distancia."""
+        rows, dist = self._radius_rows(lat, lon, r_m, kind)
+        return self._ids[rows], dist
+
+    def _radius_rows(self, lat, lon, r_m, kind):
+        tree, rows = self._trees[kind]
+        p = self.xy([lat], [lon])[0]
+        j = np.asarray(tree.query_ball_point(p, r_m), dtype=int)
+        dist = np.hypot(*(tree.data[j] - p).T)
+        order = np.argsort(dist, kind="stable")
+        return rows[j[order]], dist[order]
+
+    # ── consultas puntuales (DataFrame station_id, kind, lat, lon, dist_m) ──
+    def _result(self, rows: np.ndarray, dist: np.ndarray) -> pd.DataFrame:
+        order = np.argsort(dist, kind="stable")
+        return (self.stations.iloc[rows[order]].assign(dist_m=dist[order])
+                .reset_index(drop=True))
+
+    def knn(self, lat: float, lon: float, k: int = 5, kind: str | None = None) -> pd.DataFrame:
+        tree, rows = self._trees[kind]
+        k = min(k, tree.n)
+        dist, j = tree.query(self.xy([lat], [lon])[0], k=[*range(1, k + 1)])
+        return self._result(rows[j], dist)
+
+    def radius(self, lat: float, lon: float, r_m: float,
+               kind: str | None = None) -> pd.DataFrame:
+        return self._result(*self._radius_rows(lat, lon, r_m, kind))
+
+    def bbox(self, lat_min: float, lat_max: float, lon_min: float, lon_max: float,
+             kind: str | None = None) -> pd.DataFrame:
+        """Estaciones dentro de la caja; dist_m al centro de la caja."""
+        tree, rows = self._trees[kind]
+        lo, hi = self.xy([lat_min], [lon_min])[0], self.xy([lat_max], [lon_max])[0]
+        centre = (lo + hi) / 2
+        j = np.asarray(tree.query_ball_point(centre, np.hypot(*(hi - lo)) / 2), dtype=int)
+        pts = tree.data[j]
+        j = j[((pts >= lo) & (pts <= hi)).all(axis=1)]
+        return self._result(rows[j], np.hypot(*(tree.data[j] - centre).T))
+
+    # ── persistencia ──
+    def save(self, path: Path | None = None) -> Path:
+        path = Path(path or index_path())
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return path
+
+
+def build_index() -> StationIndex:
+    """Índice a partir de las coordenadas del pipeline (o de los CSV del repo)."""
+    try:
+        bike = storage.read_table("bike_station_coords")
+    except FileNotFoundError:
+        bike = (storage.read_years("stations_crosswalk",
+                                   columns=["codigo_estacion", "lat", "lon"])
+                .drop_duplicates("codigo_estacion", keep="last"))
+    return StationIndex.from_frames(bike, pd.read_csv(AIR_COORD))
+
+
+@lru_cache(maxsize=2)
+def _load(path: str, mtime_ns: int | None) -> StationIndex:
+    if mtime_ns is None:
+        return build_index()
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def load_index(path: Path | None = None) -> StationIndex:
+    """Índice persistido (una carga por proceso mientras no cambie el fichero)."""
+    path = Path(path or index_path())
+    mtime = path.stat().st_mtime_ns if path.exists() else None
+    return _load(path.as_posix(), mtime)
@@ -0,0 +1,138 @@
+"""
+storage.py
+----------
+Capa de almacenamiento de las tablas intermedias del pipeline.
+
+Cada tabla se guarda como Parquet (zstd) con dtypes explícitos:
+    int16   year, month, dow, hour, is_weekend
+    int32   ids de estación (codigo_estacion, station_id, nearest_aq_station)
+    float32 contaminantes, meteo y medias (todo float salvo lat/lon/dist)
+y se lee de vuelta sólo con las columnas que pide cada consumidor.
+
+Las tablas que dependen del año se particionan por año (hive):
+    data/<tabla>/year=2022/part-0.parquet
+así `read_years` lee sólo las particiones pedidas. Las que no dependen del
+año (coordenadas…) siguen en data/<tabla>.parquet (year=None).
+
+La exportación a CSV (data/<tabla>_<año>.csv, o data/<tabla>.csv sin año)
+es opcional (`EXPORT_CSV`). Si una partición no tiene .parquet pero sí .csv
+(p.ej. los CSV versionados en el repo), `read_table` lee el CSV aplicando el
+mismo esquema.
+"""
+from __future__ import annotations
+import re
+from pathlib import Path
+import pandas as pd
+import pyarrow.parquet as pq
+
+DATA_DIR = Path("data")
+EXPORT_CSV = False                                   # --csv en el pipeline
+COMPRESSION = "zstd"
+
+INT16 = {"year", "month", "dow", "hour", "is_weekend"}
+INT32 = {"codigo_estacion", "station_id", "nearest_aq_station"}
+FLOAT64 = {"lat", "lon", "dist_km", "dist_m"}        # precisión geográfica
+CATEGORY = {"station_name"}
+# contaminantes de las tablas (nombre de columna → columna de los .txt de aire)
+POLLUTANTS = {"NO2": "NO2", "PM10": "PM10", "PM2_5": "PM2.5"}
+
+
+def dtype_for(col: str, dtype) -> str | None:
+    """dtype de almacenamiento de `col` (None = se deja como está)."""
+    if col in INT16: return "int16"
+    if col in INT32: return "int32"
+    if col in CATEGORY: return "category"
+    if col in FLOAT64: return "float64"
+    if pd.api.types.is_float_dtype(dtype): return "float32"
+    return None
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    casts = {c: t for c in df.columns
+             if (t := dtype_for(c, df[c].dtype)) and df[c].dtype != t}
+    return df.astype(casts) if casts else df
+
+
+def parquet_path(name: str, year: int | None = None) -> Path:
+    if year is None:
+        return DATA_DIR / f"{name}.parquet"
+    return DATA_DIR / name / f"year={year}" / "part-0.parquet"
+
+
+def csv_path(name: str, year: int | None = None) -> Path:
+    return DATA_DIR / (f"{name}.csv" if year is None else f"{name}_{year}.csv")
+
+
+def paths(name: str, year: int | None = None) -> list[Path]:
+    """Ficheros que escribe `write_table(…, name, year)` con la configuración actual."""
+    return [parquet_path(name, year)] + ([csv_path(name, year)] if EXPORT_CSV else [])
+
+
+def write_table(df: pd.DataFrame, name: str, year: int | None = None) -> list[Path]:
+    pq_f = parquet_path(name, year)
+    pq_f.parent.mkdir(parents=True, exist_ok=True)
+    df = apply_schema(df)
+    df.to_parquet(pq_f, index=False, compression=COMPRESSION)
+    if EXPORT_CSV:
+        df.to_csv(csv_path(name, year), index=False)
+    return paths(name, year)
+
+
+def read_table(name: str, columns: list[str] | None = None,
+               year: int | None = None) -> pd.DataFrame:
+    """Lee `name` (sólo `columns` si se indican) con el esquema de la capa."""
+    pq_f = parquet_path(name, year)
+    if pq_f.exists():
+        return pd.read_parquet(pq_f, columns=columns)
+    csv_f = csv_path(name, year)
+    wanted = columns or pd.read_csv(csv_f, nrows=0).columns
+    dates = ["datetime"] if "datetime" in wanted else None
+    df = pd.read_csv(csv_f, usecols=columns, parse_dates=dates)
+    return apply_schema(df[columns] if columns else df)
+
+
+def list_years(name: str) -> list[int]:
+    """Años disponibles de `name` (particiones Parquet o CSV por año)."""
+    found = {int(p.name[5:]) for p in (DATA_DIR / name).glob("year=*")
+             if (p / "part-0.parquet").exists()}
+    pat = re.compile(re.escape(Path(name).name) + r"_(\d{4})\.csv$")
+    found |= {int(m[1]) for p in (DATA_DIR / name).parent.glob("*.csv")
+              if (m := pat.match(p.name))}
+    return sorted(found)
+
+
+def sources(name: str) -> list[tuple[int, Path]]:
+    """(año, fichero) que lee `read_table` para cada año de `name`."""
+    return [(y, pq_f if (pq_f := parquet_path(name, y)).exists() else csv_path(name, y))
+            for y in list_years(name)]
+
+
+def stamp(paths) -> tuple:
+    """Huella barata de un conjunto de ficheros: (ruta, mtime_ns, tamaño)."""
+    out = []
+    for p in map(Path, paths):
+        try:
+            st_ = p.stat()
+            out.append((p.as_posix(), st_.st_mtime_ns, st_.st_size))
+        except FileNotFoundError:
+            out.append((p.as_posix(), None, None))
+    return tuple(out)
+
+
+def read_years(name: str, years: list[int] | None = None,
+               columns: list[str] | None = None) -> pd.DataFrame:
+    """Concatena las particiones `years` (todas si None) con una columna year."""
+    ys = list_years(name) if years is None else list(years)
+    if not ys:
+        raise FileNotFoundError(f"{name}: no hay particiones por año en {DATA_DIR}")
+    return apply_schema(pd.concat([read_table(name, columns, y).assign(year=y) for y in ys],
+                                  ignore_index=True))
+
+
+def table_shape(name: str, year: int | None = None) -> tuple[int, int]:
+    """(filas, columnas) leyendo sólo los metadatos del Parquet."""
+    pq_f = parquet_path(name, year)
+    if pq_f.exists():
+        meta = pq.ParquetFile(pq_f).metadata
+        return meta.num_rows, meta.num_columns
+    return pd.read_csv(csv_path(name, year)).shape
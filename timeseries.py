@@ -0,0 +1,126 @@
+"""
+timeseries.py
+-------------
+Almacén horario a resolución completa (sin colapsar a mes × dow × hora).
+
+  data/air_hourly/year=<año>/station_id=<id>/part-0.parquet
+      una serie por estación de aire sobre la rejilla horaria completa del
+      año (8.760 u 8.784 filas; las horas sin dato quedan como NaN), ordenada
+      por datetime y en row groups de ~1 mes.
+  data/bike_city_hourly/year=<año>/part-0.parquet
+      viajes Valenbisi estimados por hora del calendario. Los exports de
+      Valenbisi sólo traen totales mes × dow × hora (ciudad) y totales por
+      estación × tramo sin fecha, así que no hay serie horaria observada por
+      estación bici: se reparte cada total entre los días de ese dow en ese
+      mes.
+
+`query()` filtra por ventana de fechas y estación con pyarrow.dataset: las
+particiones de otros años y estaciones y los row groups fuera de la ventana
+(según sus estadísticas min/max de datetime) no se llegan a leer.
+"""
+from __future__ import annotations
+import operator, shutil
+from functools import lru_cache, reduce
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import storage
+
+AIR_HOURLY = "air_hourly"
+BIKE_HOURLY = "bike_city_hourly"
+ROW_GROUP = 24 * 31                                  # ~1 mes por row group
+DROP = ["station_id", "station_name", "month", "dow", "hour"]
+
+
+def dataset_dir(name: str = AIR_HOURLY) -> Path:
+    return storage.DATA_DIR / name
+
+
+def hourly_grid(year: int) -> pd.DatetimeIndex:
+    return pd.date_range(f"{year}-01-01", f"{year + 1}-01-01", freq="h",
+                         inclusive="left", name="datetime")
+
+
+def write_air_hourly(air_full: pd.DataFrame, year: int,
+                     name: str = AIR_HOURLY) -> list[Path]:
+    """Una serie densa por estación, particionada por año y station_id."""
+    root = dataset_dir(name) / f"year={year}"
+    shutil.rmtree(root, ignore_errors=True)          # sin particiones huérfanas
+    grid = hourly_grid(year).astype(air_full["datetime"].dtype)
+    out = []
+    for st_id, g in air_full.groupby("station_id", sort=True):
+        g = (g.drop(columns=[c for c in DROP if c in g.columns])
+              .dropna(axis=1, how="all")                # variables que no mide
+              .drop_duplicates("datetime").set_index("datetime")
+              .reindex(grid).reset_index())
+        g = storage.apply_schema(g)
+        f = root / f"station_id={int(st_id)}" / "part-0.parquet"
+        f.parent.mkdir(parents=True, exist_ok=True)
+        pq.write_table(pa.Table.from_pandas(g, preserve_index=False), f,
+                       row_group_size=ROW_GROUP, compression=storage.COMPRESSION)
+        out.append(f)
+    return out
+
+
+def bike_city_hourly(bike_city: pd.DataFrame, year: int) -> pd.DataFrame:
+    """Totales mes × dow × hora → estimación por hora del calendario."""
+    grid = hourly_grid(year)
+    cal = pd.DataFrame({"datetime": grid, "month": grid.month,
+                        "dow": grid.dayofweek, "hour": grid.hour})
+    # nº de días de cada dow en cada mes (p.ej. lunes de enero de 2022 → 5)
+    days = grid[grid.hour == 0]
+    n_days = (pd.DataFrame({"month": days.month, "dow": days.dayofweek})
+                .value_counts().rename("n_days").reset_index())
+    cal = (cal.merge(bike_city[["month", "dow", "hour", "bike_trips"]],
+                     on=["month", "dow", "hour"], how="left")
+              .merge(n_days, on=["month", "dow"], how="left"))
+    cal["bike_trips_est"] = (cal["bike_trips"] / cal["n_days"]).astype("float32")
+    return cal[["datetime", "bike_trips_est"]]
+
+
+def _dataset(root: str) -> ds.Dataset:
+    """Dataset de los ficheros que hay ahora en `root`: la caché va por su
+    huella, así que ve las particiones nuevas y olvida las borradas."""
+    files = sorted(Path(root).glob("year=*/station_id=*/*.parquet"))
+    return _open_dataset(root, storage.stamp(files))
+
+
+@lru_cache(maxsize=8)
+def _open_dataset(root: str, key: tuple) -> ds.Dataset:
+    # cada estación mide variables distintas: esquema unificado de todos los ficheros
+    files = [Path(p) for p, *_ in key]
+    keys = pa.schema([("year", pa.int16()), ("station_id", pa.int32())])
+    schema = pa.unify_schemas([pq.read_schema(f) for f in files] + [keys])
+    part = ds.partitioning(keys, flavor="hive")
+    return ds.dataset([f.as_posix() for f in files], schema=schema, format="parquet",
+                      partitioning=part, partition_base_dir=root)
+
+
+def query(start=None, end=None, stations=None, columns=None,
+          name: str = AIR_HOURLY) -> pd.DataFrame:
+    """Filas con start <= datetime < end de las estaciones pedidas.
+
+    columns=None devuelve todas (year incluida); station_id y datetime se
+    incluyen siempre.
+    """
+    dset = _dataset(dataset_dir(name).as_posix())
+    ts_type = dset.schema.field("datetime").type
+    conds = []
+    if start is not None:
+        start = pd.Timestamp(start)
+        conds += [ds.field("year") >= start.year,  # poda de particiones de año
+                  ds.field("datetime") >= pa.scalar(start, ts_type)]
+    if end is not None:
+        end = pd.Timestamp(end)
+        conds += [ds.field("year") <= (end - pd.Timedelta(1, "ns")).year,
+                  ds.field("datetime") < pa.scalar(end, ts_type)]
+    if stations is not None:
+        conds.append(ds.field("station_id").isin([int(s) for s in stations]))
+    cond = reduce(operator.and_, conds) if conds else None
+    if columns is not None:
+        columns = ["station_id", "datetime"] + [c for c in columns
+                                                if c not in ("station_id", "datetime")]
+    tbl = dset.to_table(columns=columns, filter=cond)
+    return tbl.to_pandas().sort_values(["station_id", "datetime"], ignore_index=True)
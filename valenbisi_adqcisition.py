@@ -3,7 +3,9 @@ download_and_merge_valencia.py
 ------------------------------
 Starter script for the university project.
 
-* Downloads the three 2022 Valenbisi datasets from Valencia's Open‑Data portal.
+* Downloads the three 2022 Valenbisi datasets from Valencia's Open‑Data portal
+  (concurrently, into the data/raw/ mirror kept by fetcher.py; pass --offline
+  to build from the mirror alone).
 * Concatenates them into a single DataFrame (valenbisi_2022_merged.csv).
 * Contains scaffolding functions to incorporate 2022 air‑quality data
   from Generalitat Valenciana once the final file URLs are known.
@@ -12,14 +14,12 @@ Run:
     python download_and_merge_valencia.py
 
 Dependencies:
-    pip install pandas requests tqdm openpyxl
+    pip install pandas requests
 """
-import os
+import argparse
 from pathlib import Path
-import requests
 import pandas as pd
-from io import BytesIO, StringIO
-from tqdm import tqdm
+import fetcher
 
 DATA_DIR = Path("data")
 DATA_DIR.mkdir(exist_ok=True)
@@ -33,30 +33,19 @@ VALENBISI_DATASETS = {
     "tipo_abonos": "valenbisi-2022-tipo-de-abonos",
 }
 
-VALENCIA_OD_BASE = (
-    "https://valencia.opendatasoft.com/api/explore/v2.1/catalog/datasets/{}/exports/csv?limit=-1"
-)
-
 def fetch_valenbisi_dataset(dataset_id: str) -> pd.DataFrame:
-    """Download a Valenbisi dataset via the Opendatasoft CSV export API."""
-    url = VALENCIA_OD_BASE.format(dataset_id)
-    print(f"→ Downloading {dataset_id} …".ljust(60), end="")
-    r = requests.get(url, timeout=60)
-    r.raise_for_status()
-    # Guardar el contenido para inspección
-    with open(f"data/{dataset_id}.csv", "w", encoding="utf-8") as f:
-        f.write(r.text)
-    # Detectar el separador según el dataset
-    sep = ";"
-    df = pd.read_csv(StringIO(r.text), sep=sep)
-    print("✅", f"{len(df):,} rows")
+    """Sync a Valenbisi dataset with the local mirror and read it."""
+    path = fetcher.fetch(dataset_id)
+    df = pd.read_csv(path, sep=";")
+    print(f"→ {dataset_id}".ljust(60), "✅", f"{len(df):,} rows")
     return df
 
 def build_valenbisi_2022() -> pd.DataFrame:
     """Download & concatenate the three 2022 Valenbisi datasets."""
+    fetcher.fetch_all({key: (ds_id, None) for key, ds_id in VALENBISI_DATASETS.items()})
     dfs = []
     for key, ds_id in VALENBISI_DATASETS.items():
-        df = fetch_valenbisi_dataset(ds_id)
+        df = fetch_valenbisi_dataset(ds_id)       # already synced: reads the mirror
         df["source"] = key
         dfs.append(df)
     merged = pd.concat(dfs, ignore_index=True, sort=False)
@@ -69,5 +58,12 @@ def build_valenbisi_2022() -> pd.DataFrame:
 # 2. Entry‑point -------------------------------------------------------------
 # ---------------------------------------------------------------------------
 if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--offline", action="store_true", default=fetcher.OFFLINE,
+                    help="no network: read the data/raw/ mirror only")
+    ap.add_argument("--base-url", default=fetcher.BASE_URL,
+                    help="Opendatasoft API root (e.g. a local stand-in server)")
+    args = ap.parse_args()
+    fetcher.OFFLINE, fetcher.BASE_URL = args.offline, args.base_url
     print("▸ Building Valenbisi 2022 dataset …")    
     valenbisi_df = build_valenbisi_2022()
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+valenbisi_raw.py
+----------------
+Lectura tipada de los exports crudos de Valenbisi (espejo data/raw/).
+
+Cada export tiene un esquema declarado aquí: sólo se leen las columnas que
+usa el pipeline (fuera id, fecha_creacion, fecha_baja…), los textos
+repetidos (mes, dia_semana, tramo_horario) entran como category y los
+contadores como enteros pequeños (los ids de estación, int32 como en
+storage.py: en int16 read_csv los desbordaría sin avisar).
+
+month / dow / hour se obtienen decodificando una sola vez las categorías
+(12, 9 y 24 valores) y tomando por los códigos, sin recorrer cadenas fila a
+fila. Las filas con un mes o día que no se reconoce se descartan, igual que
+hacía antes el groupby con los NaN de `Series.map`.
+
+Con `chunksize` se devuelve un iterador de bloques ya decodificados, para
+agregar exports de varios años sin cargarlos enteros.
+"""
+from __future__ import annotations
+from collections.abc import Iterator
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+SEP = ";"
+MES = {m: i for i, m in enumerate(
+    ["", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
+     "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"])}
+DOW = {"Lunes": 0, "Martes": 1, "Miércoles": 2, "Miercoles": 2,
+       "Jueves": 3, "Viernes": 4, "Sábado": 5, "Sabado": 5, "Domingo": 6}
+
+# columna cruda → dtype de lectura
+SCHEMAS: dict[str, dict[str, str]] = {
+    "bike_hour": {"mes": "category", "dia_semana": "category",
+                  "tramo_horario": "category",
+                  "suma_numero_viajes": "int32",
+                  "suma_duracion_total_viajes": "int32"},
+    "bike_dev": {"codigo_estacion": "int32", "tramo_horario": "category",
+                 "numero_de_prestamos": "int32",
+                 "numero_de_devoluciones": "int32",
+                 "fecha": "category"},               # opcional: sólo exports diarios
+}
+# columna categórica → (columna decodificada, decodificador de cada categoría)
+DECODE = {
+    "mes": ("month", MES.get),
+    "dia_semana": ("dow", DOW.get),
+    "tramo_horario": ("hour", lambda s: int(s[:2]) if s[:2].isdigit() else None),
+}
+
+
+def decode(cat: pd.Series, fn) -> np.ndarray:
+    """Códigos de categoría → int8 (-1 si NaN o valor desconocido)."""
+    lut = np.array([-1 if (v := fn(c)) is None else v for c in cat.cat.categories]
+                   + [-1], dtype="int8")            # lut[-1]: código -1 (NaN)
+    return lut[cat.cat.codes.to_numpy()]
+
+
+def read_raw(path: Path, kind: str,
+             chunksize: int | None = None) -> pd.DataFrame | Iterator[pd.DataFrame]:
+    """Export `kind` con las columnas de SCHEMAS[kind] presentes en el fichero
+    y month/dow/hour en int8 (por bloques de `chunksize` filas si se pide)."""
+    schema = SCHEMAS[kind]
+    reader = pd.read_csv(path, sep=SEP, usecols=lambda c: c in schema, dtype=schema,
+                         encoding="utf-8-sig", chunksize=chunksize)
+    return _decode(reader) if chunksize is None else map(_decode, reader)
+
+
+def _decode(df: pd.DataFrame) -> pd.DataFrame:
+    ok = np.ones(len(df), bool)
+    for col, (out, fn) in DECODE.items():
+        if col in df.columns:
+            df[out] = decode(df.pop(col), fn)
+            ok &= df[out].to_numpy() >= 0
+    return df if ok.all() else df[ok].reset_index(drop=True)
@@ -0,0 +1,211 @@
+"""
+validation.py
+-------------
+Validación de calidad de datos del pipeline, antes de las etapas lentas.
+
+El esquema es declarativo: cada variable de los .txt de aire tiene su
+unidad esperada (2ª línea de cabecera) y su rango físico; cada tabla, sus
+claves. Cada tabla se valida en una pasada vectorizada (máscaras NumPy y
+un groupby por estación), sin recorrer filas:
+
+  air       unidades de cada fichero y variables desconocidas, cobertura
+            horaria por estación (8.760 h; 8.784 en bisiesto), marcas de
+            tiempo duplicadas o fuera del año y valores fuera de rango
+  bike      cobertura de la rejilla mes × dow × hora, contadores negativos,
+            horas fuera de 0-23 e ids de estación fuera de rango
+  claves    cobertura de los merges: (mes, dow, hora) bici ↔ aire, estaciones
+            bici con coordenadas y estaciones de aire con coordenadas
+
+Cada comprobación da un Issue (error o aviso). `report()` escribe el
+informe compacto en data/validation_<año>.json y, si hay algún error, lanza
+ValidationError: el build se para antes de cross-walk, serie horaria y cubo.
+"""
+from __future__ import annotations
+import calendar, json
+from pathlib import Path
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+import storage
+from air_parser import parse_header
+
+HEADER_BYTES = 4096                                  # la cabecera cabe de sobra
+
+# variable → (unidad, mínimo, máximo) físicamente plausibles
+AIR_SCHEMA: dict[str, tuple[str, float, float]] = {
+    "NO": ("µg/m³", 0, 2000), "NO2": ("µg/m³", 0, 1000), "NOx": ("µg/m³", 0, 3000),
+    "O3": ("µg/m³", 0, 500), "SO2": ("µg/m³", 0, 1000), "NH3": ("µg/m³N", 0, 1000),
+    "PM1": ("µg/m³", 0, 1000), "PM2.5": ("µg/m³", 0, 1000), "PM10": ("µg/m³", 0, 2000),
+    "CO": ("mg/m³", 0, 50), "C6H6": ("µg/m³", 0, 100), "C7H8": ("µg/m³", 0, 1000),
+    "C8H10": ("µg/m³", 0, 1000),
+    "Veloc.": ("m/s", 0, 60), "Veloc.máx.": ("m/s", 0, 80), "Direc.": ("grados", 0, 360),
+    "Temp.": ("°C", -20, 50), "H.Rel.": ("% H.R.", 0, 100), "Pres.": ("mb", 900, 1100),
+    "R.Sol.": ("W/m²", 0, 1500), "Precip.": ("l/m²", 0, 300),
+}
+# variables que la tabla ciudad necesita de al menos una estación
+AIR_REQUIRED = ["NO2", "PM10", "PM2.5", "NOx", "O3", "Veloc.", "Temp."]
+BIKE_KEYS = ["month", "dow", "hour"]
+BIKE_COUNTS = {"bike_city_agg": ["bike_trips", "bike_dur_tot"],
+               "bike_station_hour": ["prestamos_mean", "devol_mean"]}
+STATION_IDS = (1, 2**31 - 1)  # codigo_estacion válido (int32 positivo)
+MIN_COVERAGE = 0.90          # < 90 % de las horas del año: error; < 100 %: aviso
+MAX_OUT_OF_RANGE = 0.01      # > 1 % de valores fuera de rango: error; > 0: aviso
+
+
+class Issue(NamedTuple):
+    table: str
+    check: str
+    severity: str                 # "error" | "warning"
+    n: int                        # filas / claves / ficheros afectados
+    detail: str
+
+
+class ValidationError(ValueError):
+    """Hay errores de calidad de datos; el build no sigue."""
+
+
+def expected_hours(year: int) -> int:
+    return 24 * (366 if calendar.isleap(year) else 365)
+
+
+# ───────── aire ─────────
+def check_units(txts: list[Path]) -> list[Issue]:
+    """Unidades de la 2ª línea de cabecera frente a AIR_SCHEMA (sólo cabeceras)."""
+    out = []
+    for f in txts:
+        with open(f, "rb") as fh:
+            hdr = parse_header(fh.read(HEADER_BYTES))
+        for col, unit in hdr.units.items():
+            if col not in AIR_SCHEMA:
+                out.append(Issue("air", "variable_desconocida", "warning", 1,
+                                 f"{f.name}: {col} [{unit}] no está en el esquema"))
+            elif unit != AIR_SCHEMA[col][0]:
+                out.append(Issue("air", "unidad", "error", 1,
+                                 f"{f.name}: {col} en {unit!r}, se esperaba {AIR_SCHEMA[col][0]!r}"))
+    return out
+
+
+def check_air(air: pd.DataFrame, year: int) -> list[Issue]:
+    """Cobertura, duplicados, año y rangos del horario de aire en una pasada."""
+    out = []
+    st = air["station_id"].to_numpy()
+    dt = air["datetime"]
+    # duplicados (estación, hora) y horas fuera del año
+    dup = air.duplicated(["station_id", "datetime"]).to_numpy()
+    if dup.any():
+        out.append(Issue("air", "duplicados", "error", int(dup.sum()),
+                         f"marcas de tiempo repetidas en {len(np.unique(st[dup]))} estaciones"))
+    wrong_year = (dt.dt.year != year).to_numpy()
+    if wrong_year.any():
+        out.append(Issue("air", "fuera_de_año", "error", int(wrong_year.sum()),
+                         f"filas fuera de {year}"))
+    # cobertura horaria por estación
+    exp = expected_hours(year)
+    cov = pd.Series(~dup & ~wrong_year).groupby(st).sum() / exp
+    for sev, lo, hi in (("error", 0, MIN_COVERAGE), ("warning", MIN_COVERAGE, 1)):
+        mask = (cov >= lo) & (cov < hi)
+        if mask.any():
+            worst = ", ".join(f"{k} {v:.1%}" for k, v in cov[mask].sort_values().head(3).items())
+            out.append(Issue("air", "cobertura", sev, int(mask.sum()),
+                             f"estaciones por debajo del {hi:.0%} de {exp} h (peores: {worst})"))
+    # rangos: una comparación sobre la matriz de todas las variables
+    cols = [c for c in air.columns if c in AIR_SCHEMA]
+    vals = air[cols].to_numpy("float64")
+    lo = np.array([AIR_SCHEMA[c][1] for c in cols])
+    hi = np.array([AIR_SCHEMA[c][2] for c in cols])
+    present = ~np.isnan(vals)
+    bad = present & ((vals < lo) | (vals > hi))
+    n_bad, n_val = bad.sum(axis=0), present.sum(axis=0)
+    for c, nb, nv in zip(cols, n_bad, n_val):
+        if nb:
+            frac = nb / nv
+            out.append(Issue("air", "rango", "error" if frac > MAX_OUT_OF_RANGE else "warning",
+                             int(nb), f"{c}: {frac:.2%} fuera de [{AIR_SCHEMA[c][1]}, {AIR_SCHEMA[c][2]}]"))
+    missing = [c for c in AIR_REQUIRED if c not in cols or not n_val[cols.index(c)]]
+    if missing:
+        out.append(Issue("air", "variables", "error", len(missing),
+                         f"ninguna estación mide {', '.join(missing)}"))
+    return out
+
+
+# ───────── bici ─────────
+def check_bike(name: str, df: pd.DataFrame) -> list[Issue]:
+    out = []
+    counts = df[BIKE_COUNTS[name]].to_numpy("float64")
+    neg = (counts < 0).any(axis=1)
+    if neg.any():
+        out.append(Issue(name, "negativos", "error", int(neg.sum()), "contadores < 0"))
+    hour = df["hour"].to_numpy()
+    bad_hour = (hour < 0) | (hour > 23)
+    if bad_hour.any():
+        out.append(Issue(name, "hora", "error", int(bad_hour.sum()), "horas fuera de 0-23"))
+    if "codigo_estacion" in df:
+        ids = df["codigo_estacion"].to_numpy("int64")
+        bad_id = (ids < STATION_IDS[0]) | (ids > STATION_IDS[1])
+        if bad_id.any():
+            out.append(Issue(name, "estacion", "error", int(bad_id.sum()),
+                             f"codigo_estacion fuera de [{STATION_IDS[0]}, {STATION_IDS[1]}] "
+                             f"(p.ej. {', '.join(map(str, np.unique(ids[bad_id])[:5]))})"))
+    if name == "bike_city_agg":
+        keys = df[BIKE_KEYS].to_numpy("int64")
+        code = (keys[:, 0] - 1) * 168 + keys[:, 1] * 24 + keys[:, 2]
+        dup = pd.Series(code).duplicated().to_numpy()
+        if dup.any():
+            out.append(Issue(name, "duplicados", "error", int(dup.sum()), "claves mes × dow × hora repetidas"))
+        n_missing = 12 * 7 * 24 - len(np.unique(code))
+        if n_missing:
+            out.append(Issue(name, "cobertura", "warning", n_missing,
+                             "celdas mes × dow × hora sin viajes"))
+    return out
+
+
+# ───────── claves de los merges ─────────
+def _coverage(table: str, check: str, left: np.ndarray, right: np.ndarray,
+              what: str, severity: str = "warning") -> list[Issue]:
+    """Claves de `left` que no están en `right` (se perderían en el merge)."""
+    lost = np.setdiff1d(np.unique(left), np.unique(right))
+    if not len(lost):
+        return []
+    return [Issue(table, check, severity, len(lost),
+                  f"{len(lost)} {what} (p.ej. {', '.join(map(str, lost[:5]))})")]
+
+
+def _key_code(df: pd.DataFrame) -> np.ndarray:
+    k = df[BIKE_KEYS].to_numpy("int64")
+    return k[:, 0] * 10_000 + k[:, 1] * 100 + k[:, 2]
+
+
+def check_keys(bike_c: pd.DataFrame, air_c: pd.DataFrame, bike_s: pd.DataFrame,
+               air: pd.DataFrame, bike_coords: pd.DataFrame,
+               air_coords: pd.DataFrame) -> list[Issue]:
+    out = _coverage("city_merge", "claves_bici", _key_code(bike_c), _key_code(air_c),
+                    "claves mes·dow·hora de bici sin dato de aire")
+    out += _coverage("city_merge", "claves_aire", _key_code(air_c), _key_code(bike_c),
+                     "claves mes·dow·hora de aire sin dato de bici")
+    out += _coverage("crosswalk", "estaciones_bici", bike_s["codigo_estacion"].to_numpy(),
+                     bike_coords["codigo_estacion"].to_numpy(), "estaciones bici sin coordenadas")
+    out += _coverage("crosswalk", "estaciones_aire", air["station_id"].to_numpy(),
+                     air_coords["station_id"].to_numpy(), "estaciones de aire sin coordenadas")
+    return out
+
+
+# ───────── informe ─────────
+def report_path(year: int) -> Path:
+    return storage.DATA_DIR / f"validation_{year}.json"
+
+
+def report(issues: list[Issue], year: int, fail: bool = True) -> Path:
+    """Escribe el informe de `year` y lanza ValidationError si hay errores."""
+    errors = [i for i in issues if i.severity == "error"]
+    out = report_path(year)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({"year": year, "errors": len(errors),
+                               "warnings": len(issues) - len(errors),
+                               "issues": [i._asdict() for i in issues]},
+                              indent=1, ensure_ascii=False), encoding="utf-8")
+    for i in issues:
+        print(f"  {'✗' if i.severity == 'error' else '⚠'} {i.table}.{i.check}: {i.detail}")
+    if errors and fail:
+        raise ValidationError(f"{len(errors)} errores de calidad de datos en {year} "
+                              f"(ver {out})")
+    return out